@@ -0,0 +1,116 @@
+import math
+from typing import List
+
+from PIL import Image
+
+# Flat gray used for the gutters between crops, so the model sees clear borders
+GUTTER_COLOR = (128, 128, 128)
+
+# Reject a generated atlas whose aspect ratio drifts further than this from
+# the canvas we sent: the crops would no longer line up with their slots.
+MAX_ASPECT_DRIFT = 0.08
+
+# Aspect ratios the image model can be asked for (ImageConfig.aspect_ratio)
+SUPPORTED_ASPECT_RATIOS = ("1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9")
+
+
+def _ratio_value(ratio: str) -> float:
+    w, h = ratio.split(':')
+    return int(w) / int(h)
+
+
+def nearest_aspect_ratio(width: int, height: int) -> str:
+    """Return the supported aspect ratio closest (in log scale) to width:height."""
+    aspect = math.log(width / height)
+    return min(SUPPORTED_ASPECT_RATIOS, key=lambda r: abs(math.log(_ratio_value(r)) - aspect))
+
+
+def pack_crops(crops: List[Image.Image], padding: int = 32) -> tuple:
+    """
+    Pack logo crops into one padded canvas using simple shelf packing.
+
+    Crops are placed tallest first, left to right, on shelves whose width
+    targets a roughly square canvas (image models favour square outputs).
+    The canvas is then padded on the right or bottom to the nearest ratio in
+    SUPPORTED_ASPECT_RATIOS, so it can be requested explicitly and the model
+    has no reason to reframe the layout.
+
+    Args:
+        crops (List[Image.Image]): The logo crops.
+        padding (int): Gutter in pixels around and between crops.
+
+    Returns:
+        tuple: (canvas, placements, aspect_ratio) where placements[i] is the
+        (x, y, w, h) slot of crops[i] in the canvas and aspect_ratio is the
+        supported ratio string the canvas was padded to.
+    """
+    if not crops:
+        raise ValueError("No crops to pack")
+
+    total_area = sum((c.width + padding) * (c.height + padding) for c in crops)
+    shelf_width = max(max(c.width for c in crops) + padding, int(math.sqrt(total_area)))
+
+    order = sorted(range(len(crops)), key=lambda i: crops[i].height, reverse=True)
+    placements = [None] * len(crops)
+    x, y, shelf_height, canvas_width = padding, padding, 0, 0
+    for i in order:
+        w, h = crops[i].size
+        if x > padding and x + w > shelf_width:
+            # Start a new shelf
+            x = padding
+            y += shelf_height + padding
+            shelf_height = 0
+        placements[i] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+        canvas_width = max(canvas_width, x)
+
+    canvas_height = y + shelf_height + padding
+
+    # Grow one side only, so the placements stay valid
+    aspect_ratio = nearest_aspect_ratio(canvas_width, canvas_height)
+    target = _ratio_value(aspect_ratio)
+    if canvas_width / canvas_height < target:
+        canvas_width = math.ceil(canvas_height * target)
+    else:
+        canvas_height = math.ceil(canvas_width / target)
+
+    canvas = Image.new('RGB', (canvas_width, canvas_height), GUTTER_COLOR)
+    for crop, (px, py, _, _) in zip(crops, placements):
+        canvas.paste(crop.convert('RGB'), (px, py))
+    return canvas, placements, aspect_ratio
+
+
+def split_atlas(generated: Image.Image, canvas_size: tuple, placements: List[tuple]) -> List[Image.Image]:
+    """
+    Cut a generated atlas back into per-crop patches.
+
+    The generated image may come back at a different resolution, so slots are
+    scaled per axis. The patches are returned at generated resolution; the
+    caller resizes them to their boxes as for single-logo output.
+
+    Args:
+        generated (Image.Image): The atlas returned by the model.
+        canvas_size (tuple): (width, height) of the canvas that was sent.
+        placements (List[tuple]): Slots from pack_crops.
+
+    Returns:
+        List[Image.Image]: One patch per placement.
+    """
+    canvas_w, canvas_h = canvas_size
+    sent_aspect = canvas_w / canvas_h
+    got_aspect = generated.width / generated.height
+    if abs(got_aspect - sent_aspect) / sent_aspect > MAX_ASPECT_DRIFT:
+        raise RuntimeError(f"Atlas came back at aspect {got_aspect:.2f}, sent {sent_aspect:.2f}; layout can't be trusted")
+
+    sx = generated.width / canvas_w
+    sy = generated.height / canvas_h
+    patches = []
+    for x, y, w, h in placements:
+        box = (round(x * sx), round(y * sy), round((x + w) * sx), round((y + h) * sy))
+        patches.append(generated.crop(box))
+    return patches
+
+
+if __name__ == "__main__":
+    print("Atlas module ready.")
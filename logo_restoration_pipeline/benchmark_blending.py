@@ -0,0 +1,108 @@
+"""
+Benchmark the blending engines in blender.py on synthetic patches.
+
+Reports, per patch size and method, the median blend time and a seam score:
+the mean gradient magnitude on a thin band along the patch border, divided by
+the same measure on the untouched destination, and the same ratio on a band
+along the edge of the blended region (patch plus roi_margin), where a blend
+that spreads past its region leaves a step. The worse of the two is shown.
+~1.0 means the seam is invisible; larger values mean a visible edge.
+
+Usage:
+    python benchmark_blending.py [--sizes 64 128 256 512 1024] [--runs 5]
+"""
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from blender import BLEND_METHODS, blend_roi, choose_blend_method, roi_margin
+
+# seamlessClone itself, on the full frame, as the pipeline used to call it
+BASELINE = 'seamlessClone'
+
+
+def make_scene(size: int, seed: int = 0) -> tuple:
+    """
+    Build a textured destination and a brighter, differently tinted patch.
+
+    Returns:
+        tuple: (dst, src, mask, x, y)
+    """
+    rng = np.random.default_rng(seed)
+    frame = size * 2
+    yy, xx = np.mgrid[0:frame, 0:frame].astype(np.float32)
+    base = 90 + 60 * np.sin(xx / 37.0) * np.cos(yy / 53.0)
+    dst = np.clip(base[..., None] + rng.normal(0, 8, (frame, frame, 3)), 0, 255).astype(np.uint8)
+
+    src = np.clip(base[:size, :size, None] * 1.2 + np.float32([30, 10, -20]) + rng.normal(0, 4, (size, size, 3)),
+                  0, 255).astype(np.uint8)
+    cv2.circle(src, (size // 2, size // 2), size // 3, (240, 240, 240), -1)
+    cv2.ellipse(src, (size // 2, size // 2), (size // 3, size // 3), 0, 0, 90, (200, 80, 20), -1)
+
+    mask = np.full((size, size), 255, np.uint8)
+    offset = size // 2
+    return dst, src, mask, offset, offset
+
+
+def seam_score(dst: np.ndarray, out: np.ndarray, x: int, y: int, size: int, margin: int = None) -> float:
+    """
+    Gradient energy along the patch border, relative to the original image.
+
+    With `margin`, the band along the edge of the blended region is scored
+    too and the worse ratio is returned.
+    """
+    def grad(img):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        return np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+
+    grad_out, grad_dst = grad(out), grad(dst)
+    rects = [(x, y, x + size - 1, y + size - 1)]
+    if margin:
+        rects.append((x - margin, y - margin, x + size - 1 + margin, y + size - 1 + margin))
+
+    score = 0.0
+    for x0, y0, x1, y1 in rects:
+        band = np.zeros(dst.shape[:2], np.uint8)
+        cv2.rectangle(band, (x0, y0), (x1, y1), 255, 3)
+        ring = band > 0
+        score = max(score, float(grad_out[ring].mean() / max(1e-6, grad_dst[ring].mean())))
+    return score
+
+
+def run_method(method: str, dst, src, mask, x, y) -> np.ndarray:
+    if method == BASELINE:
+        size = mask.shape[0]
+        return cv2.seamlessClone(src, dst, mask.copy(), (x + size // 2, y + size // 2), cv2.NORMAL_CLONE)
+    return blend_roi(dst, src, mask, x, y, method)
+
+
+def benchmark(sizes: list, runs: int):
+    methods = [BASELINE] + list(BLEND_METHODS)
+    print(f"{'size':>6} {'method':>14} {'median ms':>10} {'seam':>7}")
+    for size in sizes:
+        dst, src, mask, x, y = make_scene(size)
+        for method in methods:
+            times = []
+            out = None
+            try:
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    out = run_method(method, dst, src, mask, x, y)
+                    times.append(time.perf_counter() - start)
+            except cv2.error as e:
+                print(f"{size:>6} {method:>14} {'failed':>10}  ({str(e).splitlines()[0][:40]})")
+                continue
+            chosen = choose_blend_method(method, size * size) if method != BASELINE else None
+            label = method if method != 'auto' else f"auto:{chosen}"
+            score = seam_score(dst, out, x, y, size, roi_margin(size, size, chosen))
+            print(f"{size:>6} {label:>14} {np.median(times) * 1000:>10.1f} {score:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark blending engines against seamlessClone.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512, 1024])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.sizes, args.runs)
@@ -0,0 +1,151 @@
+"""
+Benchmark the detector backends: PyTorch (ultralytics) against ONNX Runtime
+FP32 and INT8.
+
+Reports, per backend, the load time (including imports), per-image latency
+percentiles and throughput over a directory of images. Accuracy is measured
+against the PyTorch detections (FP32 ONNX if PyTorch is unavailable): a
+detection matches if it has the same label and IoU >= 0.5 with an unmatched
+reference box. Backends whose dependencies or model files are missing are
+skipped.
+
+Usage:
+    python benchmark_detector.py --images ./input --model yolo11n.pt \
+        --onnx yolo11n.onnx --int8 yolo11n.int8.onnx [--runs 3] [--threads 4]
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+
+from onnx_detector import IMAGE_EXTENSIONS
+
+MATCH_IOU = 0.5
+
+
+def iou_xywh(a: list, b: list) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(reference: list, detections: list) -> tuple:
+    """
+    Greedily match detections to reference detections (same label, IoU >= MATCH_IOU).
+
+    Returns:
+        tuple: (matches, list of matched IoUs, list of confidence differences)
+    """
+    used = set()
+    ious, conf_diffs = [], []
+    for det in sorted(detections, key=lambda d: -d['confidence']):
+        best, best_iou = None, MATCH_IOU
+        for j, ref in enumerate(reference):
+            if j in used or ref['label'] != det['label']:
+                continue
+            iou = iou_xywh(ref['box'], det['box'])
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            ious.append(best_iou)
+            conf_diffs.append(abs(reference[best]['confidence'] - det['confidence']))
+    return len(used), ious, conf_diffs
+
+
+def load_backend(name: str, path: str, threads: int = None):
+    """Create a detector for a backend, timing imports and model load."""
+    start = time.perf_counter()
+    if name == 'pytorch':
+        from detector import LogoDetector
+        detector = LogoDetector(path)
+    else:
+        from onnx_detector import OnnxLogoDetector
+        detector = OnnxLogoDetector(path, threads=threads)
+    return detector, time.perf_counter() - start
+
+
+def run_backend(detector, image_paths: list, runs: int, warmup: int = 2) -> tuple:
+    """
+    Returns:
+        tuple: (per-image latencies over all runs, detections of the last run by path)
+    """
+    for path in image_paths[:warmup]:
+        detector.detect_and_crop(path)
+
+    latencies = []
+    detections = {}
+    for _ in range(runs):
+        for path in image_paths:
+            start = time.perf_counter()
+            detections[path] = detector.detect_and_crop(path)
+            latencies.append(time.perf_counter() - start)
+    return latencies, detections
+
+
+def benchmark(image_dir: str, backends: list, runs: int, threads: int = None, max_images: int = None):
+    image_paths = sorted(os.path.join(image_dir, e.name) for e in os.scandir(image_dir)
+                         if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))[:max_images]
+    if not image_paths:
+        print(f"No images found in {image_dir}")
+        return
+    print(f"{len(image_paths)} image(s), {runs} run(s) each\n")
+
+    results = {}
+    for name, path in backends:
+        if not path:
+            continue
+        try:
+            detector, load_s = load_backend(name, path, threads)
+        except Exception as e:
+            print(f"{name:>8}: skipped ({e})")
+            continue
+        latencies, detections = run_backend(detector, image_paths, runs)
+        results[name] = (load_s, latencies, detections)
+
+    print(f"{'backend':>8} {'load s':>7} {'p50 ms':>8} {'p90 ms':>8} {'img/s':>7} "
+          f"{'dets':>6} {'recall':>7} {'prec':>7} {'mIoU':>6} {'dconf':>6}")
+    # Accuracy is relative to PyTorch, or to FP32 ONNX when PyTorch is unavailable
+    ref_name = next((n for n in ('pytorch', 'onnx') if n in results), None)
+    reference = results[ref_name][2] if ref_name else None
+    for name, (load_s, latencies, detections) in results.items():
+        ms = np.array(latencies) * 1000
+        total = sum(len(d) for d in detections.values())
+        line = (f"{name:>8} {load_s:>7.2f} {np.percentile(ms, 50):>8.1f} {np.percentile(ms, 90):>8.1f} "
+                f"{len(latencies) / (ms.sum() / 1000):>7.2f} {total:>6}")
+
+        if reference is not None and name != ref_name:
+            matched, ious, conf_diffs = 0, [], []
+            for path in image_paths:
+                m, i, c = match(reference[path], detections[path])
+                matched += m
+                ious += i
+                conf_diffs += c
+            ref_total = sum(len(d) for d in reference.values())
+            recall = matched / ref_total if ref_total else 1.0
+            precision = matched / total if total else 1.0
+            line += (f" {recall:>7.3f} {precision:>7.3f} {np.mean(ious) if ious else 0:>6.3f} "
+                     f"{np.mean(conf_diffs) if conf_diffs else 0:>6.3f}")
+        else:
+            line += f" {'ref':>7}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PyTorch vs ONNX Runtime (FP32/INT8) detectors.")
+    parser.add_argument('--images', default='./input', help="Directory of benchmark images")
+    parser.add_argument('--model', default='yolo11n.pt', help="PyTorch weights (reference); '' to skip")
+    parser.add_argument('--onnx', default='yolo11n.onnx', help="FP32 ONNX model; '' to skip")
+    parser.add_argument('--int8', default='yolo11n.int8.onnx', help="INT8 ONNX model; '' to skip")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument('--max-images', type=int, default=None)
+    args = parser.parse_args()
+
+    benchmark(args.images, [('pytorch', args.model), ('onnx', args.onnx), ('int8', args.int8)],
+              args.runs, args.threads, args.max_images)
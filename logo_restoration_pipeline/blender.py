@@ -2,7 +2,161 @@ import cv2
 import numpy as np
 import os
 
-def seamless_merge(original_img_path: str, generated_patch_path: str, mask_path: str, output_path: str) -> str:
+# Blending engines. 'auto' picks one by patch area (see choose_blend_method).
+BLEND_METHODS = ('auto', 'poisson', 'multiband', 'feather')
+
+# Auto mode thresholds in patch pixels: Poisson is best-looking but its solve
+# grows quickly with size, multi-band stays linear, feathering is cheapest.
+POISSON_MAX_AREA = 256 * 256
+MULTIBAND_MAX_AREA = 1024 * 1024
+
+def choose_blend_method(method: str, area: int) -> str:
+    """
+    Resolve 'auto' to a concrete blending method for a patch of `area` pixels.
+    """
+    if method not in BLEND_METHODS:
+        raise ValueError(f"Unknown blend method '{method}'. Use one of: {', '.join(BLEND_METHODS)}")
+    if method != 'auto':
+        return method
+    if area <= POISSON_MAX_AREA:
+        return 'poisson'
+    if area <= MULTIBAND_MAX_AREA:
+        return 'multiband'
+    return 'feather'
+
+# Multi-band pyramid depth cap; each level doubles how far the blend spreads
+MULTIBAND_MAX_LEVELS = 6
+
+def multiband_levels(w: int, h: int) -> int:
+    """Pyramid levels used to blend a w x h patch."""
+    return max(1, min(MULTIBAND_MAX_LEVELS, int(np.log2(max(2, min(h, w)))) - 2))
+
+def roi_margin(w: int, h: int, method: str = None) -> int:
+    """
+    Pixels of destination context blend_roi adds around a w x h patch. Every
+    pixel blend_roi may change lies within the patch grown by this margin.
+
+    The multi-band blend's low frequencies reach about 1.6 * 2^levels pixels
+    past the patch, so its margin covers 2^(levels + 1); otherwise the ROI
+    edge would cut the blend off in a hard step. With method=None the margin
+    holds for every method.
+    """
+    margin = max(8, int(0.1 * max(w, h)))
+    if method in (None, 'multiband'):
+        margin = max(margin, 2 ** (multiband_levels(w, h) + 1))
+    return margin
+
+def feather_alpha(mask: np.ndarray, feather: int) -> np.ndarray:
+    """
+    Soft alpha from a binary mask: 0 outside, ramping to 1 over `feather`
+    pixels inside the mask edge (distance transform).
+    """
+    dist = cv2.distanceTransform((mask > 0).astype(np.uint8), cv2.DIST_L2, 5)
+    return np.clip(dist / max(1, feather), 0.0, 1.0)
+
+def _feather_blend(dst: np.ndarray, src: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    feather = max(2, int(0.1 * min(mask.shape[:2])))
+    alpha = feather_alpha(mask, feather)[..., None]
+    out = src.astype(np.float32) * alpha + dst.astype(np.float32) * (1.0 - alpha)
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+def _multiband_blend(dst: np.ndarray, src: np.ndarray, mask: np.ndarray, levels: int = None) -> np.ndarray:
+    """
+    Laplacian-pyramid (multi-band) blend: low frequencies are mixed over a wide
+    transition, high frequencies over a narrow one, so there is no visible seam
+    and no ghosting.
+    """
+    h, w = mask.shape[:2]
+    if levels is None:
+        levels = multiband_levels(w, h)
+
+    # A slightly feathered base mask keeps the transition inside the patch
+    # instead of centred on its edge
+    gauss_src = [src.astype(np.float32)]
+    gauss_dst = [dst.astype(np.float32)]
+    gauss_mask = [feather_alpha(mask, max(2, int(0.05 * min(h, w))))[..., None]]
+    for _ in range(levels):
+        gauss_src.append(cv2.pyrDown(gauss_src[-1]))
+        gauss_dst.append(cv2.pyrDown(gauss_dst[-1]))
+        gauss_mask.append(cv2.pyrDown(gauss_mask[-1][..., 0])[..., None])
+
+    # Start from the blended coarsest level and add back blended Laplacian bands
+    out = gauss_src[-1] * gauss_mask[-1] + gauss_dst[-1] * (1.0 - gauss_mask[-1])
+    for level in range(levels - 1, -1, -1):
+        size = (gauss_src[level].shape[1], gauss_src[level].shape[0])
+        lap_src = gauss_src[level] - cv2.pyrUp(gauss_src[level + 1], dstsize=size)
+        lap_dst = gauss_dst[level] - cv2.pyrUp(gauss_dst[level + 1], dstsize=size)
+        m = gauss_mask[level]
+        out = cv2.pyrUp(out, dstsize=size) + lap_src * m + lap_dst * (1.0 - m)
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+def blend_roi(dst: np.ndarray, src: np.ndarray, mask: np.ndarray, x: int, y: int,
+              method: str = 'auto', clone_flag: int = cv2.NORMAL_CLONE) -> np.ndarray:
+    """
+    Blend a patch into an image, touching only a region of interest around it.
+
+    Args:
+        dst (np.ndarray): Destination image (H, W, 3), BGR uint8. Not modified.
+        src (np.ndarray): Patch (h, w, 3), BGR uint8.
+        mask (np.ndarray): Patch mask (h, w), non-zero where src should be used.
+        x (int): Left of the patch in dst.
+        y (int): Top of the patch in dst.
+        method (str): One of BLEND_METHODS.
+        clone_flag (int): seamlessClone flag for the Poisson method.
+
+    Returns:
+        np.ndarray: A copy of dst with the patch blended in.
+    """
+    if mask.ndim == 3:
+        mask = mask[..., 0]
+    dst_h, dst_w = dst.shape[:2]
+    h, w = mask.shape[:2]
+
+    # Clip the patch to the destination
+    px0, py0 = max(0, -x), max(0, -y)
+    px1, py1 = min(w, dst_w - x), min(h, dst_h - y)
+    if px1 <= px0 or py1 <= py0:
+        return dst.copy()
+    src = src[py0:py1, px0:px1]
+    mask = mask[py0:py1, px0:px1]
+    x, y = x + px0, y + py0
+    h, w = mask.shape[:2]
+
+    # ROI = patch plus a margin of destination context, so every engine sees
+    # the surroundings it blends towards and Poisson's mask stays off the border
+    chosen = choose_blend_method(method, w * h)
+    margin = roi_margin(w, h, chosen)
+    rx0, ry0 = max(0, x - margin), max(0, y - margin)
+    rx1, ry1 = min(dst_w, x + w + margin), min(dst_h, y + h + margin)
+    ox, oy = x - rx0, y - ry0
+
+    result = dst.copy()
+    roi = result[ry0:ry1, rx0:rx1]
+
+    if chosen == 'poisson':
+        bx, by, bw, bh = cv2.boundingRect((mask > 0).astype(np.uint8))
+        center = (ox + bx + bw // 2, oy + by + bh // 2)
+        try:
+            # seamlessClone writes into its mask argument, so hand it a copy
+            roi[:] = cv2.seamlessClone(src, roi.copy(), mask.copy(), center, clone_flag)
+            return result
+        except cv2.error:
+            # Poisson fails when the mask touches the ROI border; feather instead of a hard paste
+            chosen = 'feather'
+
+    src_roi = roi.copy()
+    src_roi[oy:oy + h, ox:ox + w] = src
+    mask_roi = np.zeros(roi.shape[:2], np.uint8)
+    mask_roi[oy:oy + h, ox:ox + w] = mask
+
+    if chosen == 'multiband':
+        # Levels follow the patch, not the ROI, so the spread stays within the margin
+        roi[:] = _multiband_blend(roi, src_roi, mask_roi, multiband_levels(w, h))
+    else:
+        roi[:] = _feather_blend(roi, src_roi, mask_roi)
+    return result
+
+def seamless_merge(original_img_path: str, generated_patch_path: str, mask_path: str, output_path: str, method: str = 'poisson') -> str:
     """
     Seamlessly merge the generated logo patch into the original image using Poisson blending.
     
@@ -11,6 +165,8 @@ def seamless_merge(original_img_path: str, generated_patch_path: str, mask_path:
         generated_patch_path (str): Path to the generated patch image.
         mask_path (str): Path to the binary mask.
         output_path (str): Path to save the final blended image.
+        method (str): Blending engine, one of BLEND_METHODS. Only the mask's
+            bounding box (plus a margin) is blended.
         
     Returns:
         str: Path to the saved blended image.
@@ -44,20 +200,10 @@ def seamless_merge(original_img_path: str, generated_patch_path: str, mask_path:
         # The mask should be the size of src (or at least cover the area).
         # If src and dst are full size, mask should be too.
         
-        # Find the center of the white area in the mask to use as the center point for cloning
-        # Or we can just use the center of the image if the mask is in place.
-        # The prompt says: "Center point of the mask (x + w//2, y + h//2)".
-        # This implies we might need the bounding box again, OR we calculate it from the mask moments.
-        # Let's calculate from mask moments to be safe and self-contained.
-        
-        M = cv2.moments(mask)
-        if M["m00"] != 0:
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
-            center = (cX, cY)
-        else:
-            # Fallback to image center if mask is empty (shouldn't happen)
-            center = (dst.shape[1] // 2, dst.shape[0] // 2)
+        # Blend only the mask's bounding box; the rest of the frame is untouched.
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            raise ValueError(f"Mask at {mask_path} is empty")
             
         # Perform Poisson Blending
         # We use cv2.MIXED_CLONE for better texture preservation and reduced color bleeding.
@@ -67,7 +213,7 @@ def seamless_merge(original_img_path: str, generated_patch_path: str, mask_path:
         
         flags = cv2.MIXED_CLONE
         
-        blended = cv2.seamlessClone(src, dst, mask, center, flags)
+        blended = blend_roi(dst, src[y:y+h, x:x+w], mask[y:y+h, x:x+w], x, y, method, flags)
         
         # Save output
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
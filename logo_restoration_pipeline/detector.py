@@ -1,9 +1,43 @@
 import os
 from typing import List, Dict, Union, Any
-from ultralytics import YOLO
 import cv2
 import numpy as np
 
+# If the detected class is generic (e.g., 'logo', 'car', 'tv'),
+# we try to infer the brand from the filename or default to "Unknown".
+GENERIC_CLASSES = ['car', 'truck', 'bus', 'train', 'logo', 'tv', 'vehicle', 'object', 'motorcycle', 'flag', 'banner', 'sign', 'kite', 'person']
+
+# Map common brand keywords to standardized brand names
+BRAND_MAP = {
+    'bmw': 'BMW',
+    'mercedes': 'Mercedes',
+    'benz': 'Mercedes',
+    'audi': 'Audi',
+    'tesla': 'Tesla',
+    'porsche': 'Porsche',
+    'ferrari': 'Ferrari',
+    'lamborghini': 'Lamborghini',
+    'ford': 'Ford',
+    'toyota': 'Toyota',
+    'honda': 'Honda'
+}
+
+def infer_brand_label(label: str, image_path: str) -> str:
+    """
+    Turn a detector class name into the brand label used by the pipeline.
+    
+    Shared by every YOLO backend (PyTorch and ONNX) so they label alike.
+    """
+    if label.lower() not in GENERIC_CLASSES:
+        return label
+    
+    # Try to infer from filename with more robust matching
+    filename = os.path.basename(image_path).lower()
+    for key, val in BRAND_MAP.items():
+        if key in filename:
+            return val
+    return 'Unknown'
+
 class LogoDetector:
     """
     A class to detect brand logos on products using YOLO11.
@@ -21,6 +55,9 @@ class LogoDetector:
             model_path (str): Path to the YOLO model weights. Defaults to 'yolo11n.pt'.
         """
         try:
+            # Imported here so the other backends (and modules sharing
+            # infer_brand_label) don't pay for loading PyTorch
+            from ultralytics import YOLO
             self.model = YOLO(model_path)
         except Exception as e:
             raise RuntimeError(f"Failed to load YOLO model from {model_path}: {e}")
@@ -64,43 +101,7 @@ class LogoDetector:
                     cls_id = int(box.cls[0])
                     label = self.model.names[cls_id]
                     
-                    # Logic for generic labels
-                    # If the detected class is generic (e.g., 'logo', 'car', 'tv'), 
-                    # we try to infer or default to "Unknown".
-                    
-                    brand_label = label
-                    
-                    # Enhanced inference logic
-                    generic_classes = ['car', 'truck', 'bus', 'train', 'logo', 'tv', 'vehicle', 'object', 'motorcycle', 'flag', 'banner', 'sign', 'kite', 'person']
-                    
-                    if label.lower() in generic_classes:
-                         # Try to infer from filename with more robust matching
-                         filename = os.path.basename(image_path).lower()
-                         
-                         # Map common brand keywords to standardized brand names
-                         brand_map = {
-                             'bmw': 'BMW',
-                             'mercedes': 'Mercedes',
-                             'benz': 'Mercedes',
-                             'audi': 'Audi',
-                             'tesla': 'Tesla',
-                             'porsche': 'Porsche',
-                             'ferrari': 'Ferrari',
-                             'lamborghini': 'Lamborghini',
-                             'ford': 'Ford',
-                             'toyota': 'Toyota',
-                             'honda': 'Honda'
-                         }
-                         
-                         found_brand = False
-                         for key, val in brand_map.items():
-                             if key in filename:
-                                 brand_label = val
-                                 found_brand = True
-                                 break
-                        
-                         if not found_brand:
-                             brand_label = 'Unknown'
+                    brand_label = infer_brand_label(label, image_path)
                     
                     detections.append({
                         'label': brand_label,
@@ -0,0 +1,324 @@
+import os
+import shutil
+import logging
+import subprocess
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Optional
+
+from PIL import Image
+
+from blender import roi_margin
+
+logger = logging.getLogger(__name__)
+
+# Output formats understood by the writer. 'auto' keeps the source format.
+FORMAT_EXTENSIONS = {
+    'jpeg': '.jpg',
+    'webp': '.webp',
+    'png': '.png',
+}
+
+
+
+@lru_cache(maxsize=None)
+def find_jpegtran() -> Optional[str]:
+    """
+    Locate a jpegtran that supports `-drop` (libjpeg-turbo 2.1+ or IJG jpeg 9).
+
+    JPEGTRAN overrides the executable looked up on PATH. The probe runs once
+    per process.
+
+    Returns:
+        str: Path to jpegtran, or None if it is missing or lacks -drop.
+    """
+    jpegtran = shutil.which(os.getenv('JPEGTRAN', 'jpegtran'))
+    if not jpegtran:
+        return None
+    try:
+        # Usage goes to stderr; only builds with -drop list it
+        result = subprocess.run([jpegtran, '-help'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return jpegtran if '-drop' in result.stdout + result.stderr else None
+
+
+def resolve_output_format(source_path: str, output_format: str = 'auto') -> str:
+    """
+    Resolve the output format for an image.
+
+    Args:
+        source_path (str): Path to the original input image.
+        output_format (str): One of 'auto', 'jpeg', 'webp' or 'png'.
+
+    Returns:
+        str: The concrete output format ('jpeg', 'webp' or 'png').
+    """
+    output_format = output_format.lower()
+    if output_format == 'jpg':
+        output_format = 'jpeg'
+    if output_format != 'auto':
+        if output_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported output format '{output_format}'. Use one of: auto, {', '.join(FORMAT_EXTENSIONS)}")
+        return output_format
+
+    ext = os.path.splitext(source_path)[1].lower()
+    if ext in ('.jpg', '.jpeg'):
+        return 'jpeg'
+    if ext == '.webp':
+        return 'webp'
+    return 'png'
+
+
+def _load_metadata(source: Image.Image) -> dict:
+    """Collect the ICC profile and EXIF block of the source image."""
+    metadata = {}
+    icc_profile = source.info.get('icc_profile')
+    if icc_profile:
+        metadata['icc_profile'] = icc_profile
+    exif = source.info.get('exif')
+    if exif:
+        metadata['exif'] = exif
+    return metadata
+
+
+def _mcu_size(source: Image.Image) -> tuple:
+    """
+    Return the (width, height) of one JPEG MCU for the source image.
+
+    The MCU is 8x8 pixels scaled by the largest horizontal/vertical sampling
+    factor, e.g. 16x16 for 4:2:0 chroma subsampling.
+    """
+    layers = getattr(source, 'layer', None) or []
+    h_max = max((layer[1] for layer in layers), default=1)
+    v_max = max((layer[2] for layer in layers), default=1)
+    return 8 * h_max, 8 * v_max
+
+
+def _align_box(box: list, mcu: tuple, size: tuple) -> tuple:
+    """
+    Grow an [x, y, w, h] box to the MCU grid and clamp it to the image.
+
+    Returns:
+        tuple: (left, top, right, bottom) aligned to MCU boundaries.
+    """
+    x, y, w, h = box
+    mcu_w, mcu_h = mcu
+    width, height = size
+    # Blending may touch the blend ROI margin around the box, not just the box
+    margin = roi_margin(w, h)
+
+    left = max(0, x - margin) // mcu_w * mcu_w
+    top = max(0, y - margin) // mcu_h * mcu_h
+    right = -(-min(width, x + w + margin) // mcu_w) * mcu_w
+    bottom = -(-min(height, y + h + margin) // mcu_h) * mcu_h
+    return left, top, min(right, width), min(bottom, height)
+
+
+def _jpeg_save_kwargs(source: Image.Image, quality: int) -> dict:
+    """
+    Encoder settings that reuse the source quantization tables and sampling.
+
+    `quality` is only used when the source has no tables: Pillow rescales
+    custom qtables by the quality setting, so passing both would not reuse
+    the source tables.
+    """
+    from PIL import JpegImagePlugin
+
+    if not getattr(source, 'quantization', None):
+        return {'quality': quality}
+
+    kwargs = {'qtables': source.quantization}
+    sampling = JpegImagePlugin.get_sampling(source)
+    if sampling != -1:
+        kwargs['subsampling'] = sampling
+    return kwargs
+
+
+def _same_tables(path: str, expected: dict) -> bool:
+    """True if the JPEG at `path` uses exactly the `expected` quantization tables."""
+    with Image.open(path) as written:
+        tables = getattr(written, 'quantization', None) or {}
+    return {k: list(v) for k, v in tables.items()} == {k: list(v) for k, v in expected.items()}
+
+
+def _drop_patches(image: Image.Image, source_path: str, output_path: str, boxes: List[list]) -> bool:
+    """
+    Write a JPEG by losslessly dropping re-encoded logo patches into the source.
+
+    Only the MCU-aligned regions around the restored boxes are re-encoded, with
+    the source's quantization tables and sampling factors. `jpegtran -drop`
+    splices them into the original file, so every other block keeps its
+    original DCT coefficients and all markers (EXIF, ICC, XMP) are copied.
+
+    Args:
+        image (Image.Image): The restored full image.
+        source_path (str): Path to the original JPEG.
+        output_path (str): Path to save the result.
+        boxes (List[list]): Restored [x, y, w, h] boxes.
+
+    Returns:
+        bool: True if the output was written, False if the caller should fall
+        back to a full re-encode.
+    """
+    jpegtran = find_jpegtran()
+    if not jpegtran:
+        # OutputWriter warns about this once at startup
+        logger.debug("jpegtran with -drop not available, falling back to full re-encode")
+        return False
+
+    with Image.open(source_path) as source:
+        if source.format != 'JPEG' or source.size != image.size:
+            return False
+        mcu = _mcu_size(source)
+        save_kwargs = _jpeg_save_kwargs(source, 95)
+        mode = source.mode
+
+    patch_image = image if image.mode == mode else image.convert(mode)
+
+    with tempfile.TemporaryDirectory(prefix='encoder_') as tmp_dir:
+        current = source_path
+        for i, box in enumerate(boxes):
+            left, top, right, bottom = _align_box(box, mcu, image.size)
+            if right <= left or bottom <= top:
+                continue
+
+            patch_path = os.path.join(tmp_dir, f"patch_{i}.jpg")
+            patch_image.crop((left, top, right, bottom)).save(patch_path, 'JPEG', **save_kwargs)
+            # Blocks spliced with other tables would decode wrongly in the output
+            if 'qtables' in save_kwargs and not _same_tables(patch_path, save_kwargs['qtables']):
+                logger.warning("Patch was encoded with different quantization tables, falling back to full re-encode")
+                return False
+
+            next_path = os.path.join(tmp_dir, f"step_{i}.jpg")
+            cmd = [jpegtran, '-copy', 'all', '-drop', f"+{left}+{top}", patch_path, '-outfile', next_path, current]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0 or not os.path.exists(next_path):
+                logger.warning(f"jpegtran -drop failed ({result.stderr.strip()}), falling back to full re-encode")
+                return False
+            current = next_path
+
+        shutil.copyfile(current, output_path)
+    return True
+
+
+def write_output(image: Image.Image, source_path: str, output_path: str, boxes: Optional[List[list]] = None,
+                 output_format: str = 'auto', quality: int = 95) -> str:
+    """
+    Encode the restored image, preserving the source metadata.
+
+    With output_format 'auto', JPEG sources are written back by re-encoding
+    only the blocks overlapping the restored boxes (see `_drop_patches`), or
+    by a single full encode with the source quantization tables when jpegtran
+    is unavailable. An explicit format always does one full encode at the
+    given quality.
+
+    Args:
+        image (Image.Image): The restored full image.
+        source_path (str): Path to the original input image (metadata source).
+        output_path (str): Path to save the result. The extension is replaced
+            to match the output format.
+        boxes (List[list], optional): Restored [x, y, w, h] boxes.
+        output_format (str): One of 'auto', 'jpeg', 'webp' or 'png'.
+        quality (int): Encoder quality for JPEG/WebP.
+
+    Returns:
+        str: Path to the saved image.
+    """
+    try:
+        fmt = resolve_output_format(source_path, output_format)
+        output_path = os.path.splitext(output_path)[0] + FORMAT_EXTENSIONS[fmt]
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+        # 'auto' keeps the source encoding (same format, same JPEG tables);
+        # an explicit format re-encodes at the requested quality.
+        keep_source = output_format.lower() == 'auto'
+        source_ext = os.path.splitext(source_path)[1].lower().replace('.jpeg', '.jpg')
+        same_format = source_ext == FORMAT_EXTENSIONS[fmt]
+
+        if keep_source and same_format and boxes is not None and not boxes:
+            # Nothing was restored: the source bytes are already the answer
+            shutil.copyfile(source_path, output_path)
+            logger.info(f"Wrote {output_path} (unchanged copy)")
+            return output_path
+
+        if keep_source and fmt == 'jpeg' and boxes and same_format:
+            if _drop_patches(image, source_path, output_path, boxes):
+                logger.info(f"Wrote {output_path} (re-encoded {len(boxes)} region(s) only)")
+                return output_path
+
+        with Image.open(source_path) as source:
+            save_kwargs = _load_metadata(source)
+            if fmt == 'jpeg':
+                if keep_source and source.format == 'JPEG':
+                    save_kwargs.update(_jpeg_save_kwargs(source, quality))
+                else:
+                    save_kwargs['quality'] = quality
+
+        if fmt == 'jpeg':
+            if image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+            image.save(output_path, 'JPEG', **save_kwargs)
+            if 'qtables' in save_kwargs and not _same_tables(output_path, save_kwargs['qtables']):
+                logger.warning(f"{output_path} was not written with the source quantization tables")
+        elif fmt == 'webp':
+            image.save(output_path, 'WEBP', quality=quality, **save_kwargs)
+        else:
+            image.save(output_path, 'PNG', **save_kwargs)
+
+        logger.info(f"Wrote {output_path} ({fmt})")
+        return output_path
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to write output image: {e}")
+
+
+class OutputWriter:
+    """
+    Encodes restored images on a small worker pool.
+
+    Encoding (and the jpegtran subprocess) runs off the main loop so the
+    pipeline can start detecting the next image while the previous one is
+    being written.
+    """
+
+    def __init__(self, output_format: str = 'auto', quality: int = 95, max_workers: int = 2):
+        """
+        Initialize the OutputWriter.
+
+        Args:
+            output_format (str): One of 'auto', 'jpeg', 'webp' or 'png'.
+            quality (int): Encoder quality for JPEG/WebP.
+            max_workers (int): Number of encoder threads.
+        """
+        self.output_format = output_format
+        self.quality = quality
+        if output_format.lower() == 'auto' and not find_jpegtran():
+            logger.warning("jpegtran with -drop support not found (install libjpeg-turbo 2.1+ or set JPEGTRAN); "
+                           "JPEG outputs will be fully re-encoded instead of patched in place")
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='encoder')
+
+    def submit(self, image: Image.Image, source_path: str, output_path: str, boxes: Optional[List[list]] = None) -> Future:
+        """
+        Queue an image for encoding.
+
+        Returns:
+            Future: Resolves to the saved path, or raises RuntimeError.
+        """
+        return self.executor.submit(write_output, image, source_path, output_path, boxes,
+                                    self.output_format, self.quality)
+
+    def close(self):
+        """Wait for all queued images to be written."""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    print("Encoder module ready.")
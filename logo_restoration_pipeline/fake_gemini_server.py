@@ -0,0 +1,192 @@
+"""
+Fake Gemini endpoint - a local stand-in for generateContent with fault injection.
+
+Point the pipeline at it with:
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_GEMINI_API_KEY=fake python main.py
+"""
+import io
+import json
+import math
+import time
+import base64
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('uniform', 'constant', 'lognormal', 'exponential')
+
+# Errors injected at random, as (HTTP status, Google RPC status)
+INJECTED_ERRORS = [
+    (429, 'RESOURCE_EXHAUSTED'),
+    (500, 'INTERNAL'),
+    (503, 'UNAVAILABLE'),
+]
+
+
+class FakeGeminiConfig:
+    """Fault-injection knobs shared by all request handlers."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = None,
+                 distribution: str = 'uniform', output_size: int = 0):
+        """
+        Args:
+            latency (float): Base latency in seconds ('uniform', 'constant'),
+                median ('lognormal') or mean ('exponential').
+            jitter (float): Spread: extra uniform latency in seconds for
+                'uniform', sigma of the underlying normal for 'lognormal'.
+            error_rate (float): Probability [0, 1] of answering with a 429/5xx.
+            seed (int, optional): Seed for reproducible fault injection.
+            distribution (str): One of LATENCY_DISTRIBUTIONS.
+            output_size (int): If set, answer with a square image of this
+                size (like Gemini's fixed 1K/2K outputs) instead of echoing
+                the input at its own size.
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.distribution = distribution
+        self.output_size = output_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _sample_latency(self) -> float:
+        if self.distribution == 'constant' or self.latency <= 0:
+            return max(0.0, self.latency)
+        if self.distribution == 'lognormal':
+            return self.random.lognormvariate(math.log(self.latency), self.jitter)
+        if self.distribution == 'exponential':
+            return self.random.expovariate(1.0 / self.latency)
+        return self.latency + self.random.uniform(0, self.jitter)
+
+    def next_fault(self) -> tuple:
+        """Return (delay_seconds, error_or_None) for the next request."""
+        with self.lock:
+            self.calls += 1
+            delay = self._sample_latency()
+            error = None
+            if self.random.random() < self.error_rate:
+                error = self.random.choice(INJECTED_ERRORS)
+                self.errors += 1
+            return delay, error
+
+
+def _first_image_part(body: dict):
+    """Return the first inlineData part of the request (the cropped logo)."""
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            inline = part.get('inlineData') or part.get('inline_data')
+            if inline:
+                return inline
+    return None
+
+
+def _resize_image_part(inline: dict, size: int) -> dict:
+    """Re-encode an inlineData image as a size x size PNG."""
+    from PIL import Image
+
+    # The SDK sends url-safe base64; accept both alphabets
+    data = inline['data'].replace('-', '+').replace('_', '/')
+    image = Image.open(io.BytesIO(base64.b64decode(data + '=' * (-len(data) % 4))))
+    buffer = io.BytesIO()
+    image.convert('RGB').resize((size, size)).save(buffer, 'PNG')
+    return {'mimeType': 'image/png', 'data': base64.b64encode(buffer.getvalue()).decode('ascii')}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """Answers generateContent by echoing the first input image back."""
+
+    config = FakeGeminiConfig()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            self._send_json(404, {'error': {'code': 404, 'message': f"Unknown path {self.path}", 'status': 'NOT_FOUND'}})
+            return
+
+        delay, error = self.config.next_fault()
+        time.sleep(delay)
+
+        if error:
+            code, status = error
+            self._send_json(code, {'error': {'code': code, 'message': f"Injected {status}", 'status': status}})
+            return
+
+        image = _first_image_part(body)
+        if image is None:
+            self._send_json(400, {'error': {'code': 400, 'message': "No image in request", 'status': 'INVALID_ARGUMENT'}})
+            return
+
+        if self.config.output_size:
+            image = _resize_image_part(image, self.config.output_size)
+
+        self._send_json(200, {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'inlineData': image}]},
+                'finishReason': 'STOP',
+            }],
+        })
+
+
+def start_fake_server(host: str = '127.0.0.1', port: int = 0, config: FakeGeminiConfig = None) -> ThreadingHTTPServer:
+    """
+    Start the fake server on a background thread.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind (0 picks a free port).
+        config (FakeGeminiConfig, optional): Fault-injection settings.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its base URL is
+        f"http://{host}:{server.server_address[1]}"; stop it with shutdown().
+    """
+    handler = type('ConfiguredFakeGeminiHandler', (FakeGeminiHandler,), {'config': config or FakeGeminiConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server with fault injection.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Base/median/mean latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform spread in seconds, or lognormal sigma")
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability of a 429/5xx answer")
+    parser.add_argument('--output-size', type=int, default=0, help="Answer with square images of this size")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = FakeGeminiConfig(args.latency, args.jitter, args.error_rate, args.seed,
+                              args.distribution, args.output_size)
+    handler = type('ConfiguredFakeGeminiHandler', (FakeGeminiHandler,), {'config': config})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Fake Gemini server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Served {config.calls} call(s), injected {config.errors} error(s)")
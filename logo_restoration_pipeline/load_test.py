@@ -0,0 +1,256 @@
+"""
+Offline load test - drives main's pipeline against a fake detector and a
+local fake Gemini server.
+
+Generates synthetic catalog images, runs main.main() over them with the
+deterministic FakeDetector and fake_gemini_server.py standing in for the
+real models, and reports throughput, latency percentiles, peak RSS and API
+call counts. No GPU, model weights or API key needed.
+
+Usage:
+    python load_test.py --images 2000 --latency 0.8 --jitter 0.5 --distribution lognormal --error-rate 0.05
+"""
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import threading
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+from fake_gemini_server import FakeGeminiConfig, LATENCY_DISTRIBUTIONS, start_fake_server
+from masker import encode_mask_rle
+
+logger = logging.getLogger(__name__)
+
+
+class FakeDetector:
+    """
+    Deterministic stand-in for LogoDetector / SAM3LogoDetector.
+
+    The number, position and confidence of the boxes depend only on the
+    image filename and the seed, so repeated runs see identical work. Like
+    SAM3LogoDetector, each detection carries a box-local RLE mask (an ellipse
+    filling the box) unless masks=False.
+    """
+
+    def __init__(self, max_logos: int = 3, label: str = 'BMW', seed: int = 0, masks: bool = True):
+        self.max_logos = max_logos
+        self.label = label
+        self.seed = seed
+        self.masks = masks
+
+    def detect_and_crop(self, image_path: str) -> list:
+        rng = random.Random(f"{self.seed}:{os.path.basename(image_path)}")
+        with Image.open(image_path) as image:
+            width, height = image.size
+
+        detections = []
+        for _ in range(rng.randint(1, self.max_logos)):
+            w = rng.randint(32, max(32, width // 4))
+            h = rng.randint(32, max(32, height // 4))
+            x = rng.randint(0, width - w)
+            y = rng.randint(0, height - h)
+            detection = {'label': self.label, 'box': [x, y, w, h], 'confidence': rng.uniform(0.3, 0.99)}
+            if self.masks:
+                mask = np.zeros((h, w), np.uint8)
+                cv2.ellipse(mask, (w // 2, h // 2), (w // 2, h // 2), 0, 0, 360, 255, -1)
+                detection['mask'] = encode_mask_rle(mask)
+            detections.append(detection)
+        return detections
+
+
+def make_synthetic_images(input_dir: str, count: int, size: tuple = (640, 480), seed: int = 0) -> int:
+    """
+    Write `count` synthetic product photos to input_dir (existing files are reused).
+
+    Returns:
+        int: Number of images newly written.
+    """
+    os.makedirs(input_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = size
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 120 + 50 * np.sin(xx / 41.0) * np.cos(yy / 29.0)
+
+    written = 0
+    for i in range(count):
+        path = os.path.join(input_dir, f"synthetic_bmw_{i:06d}.jpg")
+        if os.path.exists(path):
+            continue
+        pixels = np.clip(base[..., None] + rng.normal(0, 10, (height, width, 3)), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels)
+        draw = ImageDraw.Draw(image)
+        cx, cy, r = int(rng.integers(60, width - 60)), int(rng.integers(60, height - 60)), int(rng.integers(20, 50))
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=(50, 50, 50))
+        image.save(path, quality=90)
+        written += 1
+    return written
+
+
+def make_reference_logo(path: str) -> str:
+    """Write a simple blue/white roundel as the brand reference asset."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        logo = Image.new('RGB', (200, 200), (0, 0, 0))
+        draw = ImageDraw.Draw(logo)
+        draw.ellipse((0, 0, 199, 199), fill=(255, 255, 255))
+        draw.pieslice((0, 0, 199, 199), 0, 90, fill=(0, 0, 255))
+        draw.pieslice((0, 0, 199, 199), 180, 270, fill=(0, 0, 255))
+        logo.save(path)
+    return path
+
+
+def percentiles(values: list, points=(50, 90, 99)) -> dict:
+    if not values:
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": float(np.percentile(values, p)) for p in points}
+
+
+def run_pipeline(input_dir: str, output_dir: str, brand_assets: dict, detector, server_config: FakeGeminiConfig,
+                 env: dict = None, verbose: bool = False) -> dict:
+    """
+    Run main.main() over input_dir with `detector` and a fake Gemini server.
+
+    Args:
+        input_dir (str): Directory of input images.
+        output_dir (str): Directory for pipeline outputs.
+        brand_assets (dict): Brand key -> reference logo path.
+        detector: Object with detect_and_crop(image_path).
+        server_config (FakeGeminiConfig): Fake server behaviour.
+        env (dict, optional): Extra environment (e.g. GEMINI_MAX_CONCURRENCY),
+            applied before the pipeline modules are imported.
+        verbose (bool): Keep the pipeline's INFO logging.
+
+    Returns:
+        dict: The run report.
+    """
+    server = start_fake_server(config=server_config)
+    os.environ.update(env or {})
+    # Never let a load test reach the real API
+    os.environ['GEMINI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['GOOGLE_GEMINI_API_KEY'] = 'fake-key'
+
+    import main  # configures logging on import
+    import encoder
+    import generator
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    lock = threading.Lock()
+    image_start = {}
+    image_latency = []
+    call_latency = []
+    call_failures = [0]
+
+    queue_image = main.queue_image
+    write_output = encoder.write_output
+    generate_content = generator._generate_content
+
+    def timed_queue_image(img_path, *args, **kwargs):
+        with lock:
+            image_start[img_path] = time.perf_counter()
+        return queue_image(img_path, *args, **kwargs)
+
+    def timed_write_output(image, source_path, *args, **kwargs):
+        try:
+            return write_output(image, source_path, *args, **kwargs)
+        finally:
+            with lock:
+                if source_path in image_start:
+                    image_latency.append(time.perf_counter() - image_start.pop(source_path))
+
+    def timed_generate_content(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return generate_content(*args, **kwargs)
+        except Exception:
+            with lock:
+                call_failures[0] += 1
+            raise
+        finally:
+            with lock:
+                call_latency.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        with patch.object(main, 'INPUT_DIR', input_dir), \
+             patch.object(main, 'OUTPUT_DIR', output_dir), \
+             patch.object(main, 'BRAND_ASSETS', brand_assets), \
+             patch.object(main, 'create_detector', return_value=detector), \
+             patch.object(main, 'queue_image', timed_queue_image), \
+             patch.object(encoder, 'write_output', timed_write_output), \
+             patch.object(generator, '_generate_content', timed_generate_content), \
+             patch.object(generator, 'DEBUG_DIR', os.path.join(output_dir, 'debug')):
+            main.main()
+    finally:
+        server.shutdown()
+    elapsed = time.perf_counter() - start
+
+    completed = len(image_latency)
+    return {
+        'images_completed': completed,
+        'elapsed_s': elapsed,
+        'throughput_images_per_s': completed / elapsed if elapsed else 0.0,
+        'image_latency_s': percentiles(image_latency),
+        'api_latency_s': percentiles(call_latency),
+        'api_calls': len(call_latency),
+        'api_call_failures': call_failures[0],
+        'server_calls': server_config.calls,
+        'server_injected_errors': server_config.errors,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def print_report(report: dict):
+    print("\n=== Load test report ===")
+    print(f"Images completed : {report['images_completed']} in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_images_per_s']:.2f} images/s)")
+    for name in ('image_latency_s', 'api_latency_s'):
+        values = ', '.join(f"{k}={v:.3f}s" if v is not None else f"{k}=n/a" for k, v in report[name].items())
+        print(f"{name:<17}: {values}")
+    print(f"API calls        : {report['api_calls']} ({report['api_call_failures']} failed), "
+          f"server saw {report['server_calls']} ({report['server_injected_errors']} injected errors)")
+    print(f"Peak RSS         : {report['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test for the logo restoration pipeline.")
+    parser.add_argument('--images', type=int, default=200, help="Number of synthetic images")
+    parser.add_argument('--image-size', type=int, nargs=2, default=[640, 480], metavar=('W', 'H'))
+    parser.add_argument('--workdir', default='./load_test_run', help="Where inputs and outputs are written")
+    parser.add_argument('--max-logos', type=int, default=3, help="Maximum fake detections per image")
+    parser.add_argument('--latency', type=float, default=0.5, help="Fake API base/median/mean latency (s)")
+    parser.add_argument('--jitter', type=float, default=0.3, help="Uniform spread (s) or lognormal sigma")
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--output-size', type=int, default=0, help="Fake API output image size (e.g. 2048)")
+    parser.add_argument('--concurrency', type=int, default=4, help="GEMINI_MAX_CONCURRENCY for the run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help="Write the report as JSON to this path")
+    parser.add_argument('--verbose', action='store_true', help="Keep the pipeline's INFO logging")
+    args = parser.parse_args()
+
+    input_dir = os.path.join(args.workdir, 'input')
+    output_dir = os.path.join(args.workdir, 'output')
+    written = make_synthetic_images(input_dir, args.images, tuple(args.image_size), args.seed)
+    print(f"Synthetic inputs ready in {input_dir} ({written} new)")
+    reference = make_reference_logo(os.path.join(args.workdir, 'assets', 'bmw_logo.png'))
+
+    config = FakeGeminiConfig(args.latency, args.jitter, args.error_rate, args.seed,
+                              args.distribution, args.output_size)
+    env = {'GEMINI_MAX_CONCURRENCY': str(args.concurrency)}
+
+    report = run_pipeline(input_dir, output_dir, {'bmw': reference}, FakeDetector(args.max_logos, seed=args.seed),
+                          config, env, args.verbose)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -1,32 +1,69 @@
 import os
-import glob
+import sys
+import json
+import time
 import logging
+import argparse
+from collections import deque
 from dotenv import load_dotenv
 
+# Load environment variables (before DETECTOR_BACKEND decides what to import)
+load_dotenv()
+
+# Detector backend: 'auto' (SAM 3 if installed, else YOLO), 'sam3', 'yolo'
+# (ultralytics/PyTorch) or 'onnx' (ONNX Runtime, see onnx_detector.py)
+DETECTOR_BACKENDS = ('auto', 'sam3', 'yolo', 'onnx')
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "auto").lower()
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "yolo11n.onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0")) or None
+
 # Import modules
-try:
-    from sam3_detector import SAM3LogoDetector
-    USE_SAM3 = True
-except ImportError:
-    from detector import LogoDetector
-    USE_SAM3 = False
-    
-from masker import create_clinical_mask
-from generator import restore_logo
+USE_SAM3 = False
+if DETECTOR_BACKEND in ('auto', 'sam3'):
+    try:
+        from sam3_detector import SAM3LogoDetector
+        USE_SAM3 = True
+    except ImportError:
+        # YOLO fallback is imported in create_detector(), so main stays importable
+        # (e.g. by load_test.py) without ultralytics installed
+        if DETECTOR_BACKEND == 'sam3':
+            raise
+    
+from masker import create_local_mask
+from generator import generate_patch, generate_atlas_patches, blend_patch, GEMINI_MAX_CONCURRENCY
+from resilience import CircuitOpenError
+from scheduler import LogoScheduler, AtlasBatcher
 from blender import seamless_merge
+from encoder import OutputWriter
+from sharding import SHARD_KEYS, parse_shard, iter_shard, manifest_path, ShardManifest, merge_manifests
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Configuration
 INPUT_DIR = "./input"
 OUTPUT_DIR = "./output"
 ASSETS_DIR = "./assets"
 
+# Output encoding: 'auto' keeps the input format, or force 'jpeg', 'webp', 'png'
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "auto")
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", "95"))
+OUTPUT_WORKERS = 2
+
+# Scheduling: images whose logos may be queued at once, and the time budget
+# per image used to prioritise logos of older images
+MAX_IN_FLIGHT_IMAGES = 4
+IMAGE_DEADLINE_SECONDS = 300
+
+# Atlas mode: pack up to this many same-brand crops (across images) into one
+# Gemini request. 1 sends every logo on its own.
+ATLAS_MAX_LOGOS = int(os.getenv("ATLAS_MAX_LOGOS", "1"))
+
+# Debugging: also write each logo's box-local blend mask under output/masks.
+# Blending reads the detector's RLE mask directly, so this is off by default.
+SAVE_MASKS = bool(int(os.getenv("SAVE_MASKS", "0")))
+
 # Brand Assets Map (Example)
 # In a real scenario, this might be loaded from a config file or database
 BRAND_ASSETS = {
@@ -36,122 +73,298 @@ BRAND_ASSETS = {
     # Add more brands as needed
 }
 
-def main():
+def create_detector():
+    """
+    Create the configured logo detector (see DETECTOR_BACKEND).
+    """
+    if DETECTOR_BACKEND not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown DETECTOR_BACKEND '{DETECTOR_BACKEND}'. Use one of: {', '.join(DETECTOR_BACKENDS)}")
+    if USE_SAM3:
+        detector = SAM3LogoDetector()
+        logger.info("SAM 3 LogoDetector initialized.")
+    elif DETECTOR_BACKEND == 'onnx':
+        from onnx_detector import OnnxLogoDetector
+        detector = OnnxLogoDetector(ONNX_MODEL_PATH, threads=ONNX_THREADS)
+        logger.info(f"ONNX Runtime LogoDetector initialized ({ONNX_MODEL_PATH}).")
+    else:
+        from detector import LogoDetector
+        detector = LogoDetector()
+        logger.info("YOLO LogoDetector initialized.")
+    return detector
+
+def resolve_brand(label: str, filename: str):
+    """
+    Map a detection label to a BRAND_ASSETS key.
+
+    Returns:
+        tuple: (brand_key, label) with the label possibly replaced by the
+        brand inferred from the filename.
+    """
+    brand_key = label.lower()
+    
+    # If using SAM 3, it returns generic 'logo', try to infer brand from filename
+    if brand_key == 'logo' and USE_SAM3:
+        filename_lower = filename.lower()
+        for brand in BRAND_ASSETS.keys():
+            if brand in filename_lower:
+                brand_key = brand
+                label = brand.upper()
+                logger.info(f"    - Inferred brand '{brand}' from filename")
+                break
+    return brand_key, label
+
+def queue_image(img_path: str, detector, batcher: AtlasBatcher, references: dict, rel_path: str = None,
+                output_dir: str = None):
+    """
+    Detect logos in one image and queue their generation jobs.
+    
+    Args:
+        rel_path (str, optional): Path relative to the input root; the output
+            is written under the same sub-directory of output_dir.
+        output_dir (str, optional): Output root, OUTPUT_DIR by default.
+    
+    Returns:
+        dict: The in-flight image record, or None if nothing was queued.
+    """
+    from PIL import Image as PILImage
+    
+    filename = os.path.basename(img_path)
+    rel_path = rel_path or filename
+    output_dir = output_dir or OUTPUT_DIR
+    logger.info(f"Processing {filename}...")
+    
+    # A. Detect Logo
+    detections = detector.detect_and_crop(img_path)
+    
+    if not detections:
+        logger.info(f"No logos detected in {filename}. Skipping.")
+        return None
+    
+    # Load original image once
+    full_image = PILImage.open(img_path)
+    full_image.load()
+    deadline = time.time() + IMAGE_DEADLINE_SECONDS
+    jobs = []
+    queued = []
+    
+    # Process each detected logo
+    for i, detection in enumerate(detections):
+        label = detection['label']
+        box = detection['box']
+        confidence = detection['confidence']
+        
+        logger.info(f"  - Detected '{label}' with confidence {confidence:.2f}")
+        
+        # Determine Brand and Reference Asset
+        brand_key, label = resolve_brand(label, filename)
+        
+        # Check if we have the asset for the detected brand
+        if brand_key not in BRAND_ASSETS:
+            logger.warning(f"    - Brand '{label}' detected but asset not found in BRAND_ASSETS. Skipping.")
+            continue
+        
+        reference_logo_path = BRAND_ASSETS.get(brand_key)
+        if not reference_logo_path or not os.path.exists(reference_logo_path):
+            logger.warning(f"    - Reference asset for '{brand_key}' not found at {reference_logo_path}. Skipping.")
+            continue
+        
+        if brand_key not in references:
+            references[brand_key] = PILImage.open(reference_logo_path)
+            references[brand_key].load()
+
+        # B. Optionally save the box-local clinical mask for inspection
+        if SAVE_MASKS:
+            mask_filename = f"mask_{filename}_{i}.png"
+            # Mirror the input tree like the restored image, so same-named files don't collide
+            mask_path = os.path.join(output_dir, "masks", os.path.dirname(rel_path), mask_filename)
+            os.makedirs(os.path.dirname(mask_path), exist_ok=True)
+            PILImage.fromarray(create_local_mask(box, detection.get('mask'))).save(mask_path)
+            logger.info(f"    - Clinical mask for box {box} saved at {mask_path}")
+        
+        # C. Queue the Gemini call; the scheduler orders it against every other pending logo
+        future = batcher.add(brand_key, (full_image, box), confidence, box, deadline)
+        jobs.append((i, box, detection.get('mask'), future))
+        queued.append({'label': label, 'box': box, 'confidence': confidence, 'mask': detection.get('mask')})
+    
+    return {'path': img_path, 'rel_path': rel_path, 'output_dir': output_dir, 'filename': filename,
+            'image': full_image, 'jobs': jobs, 'detections': queued}
+
+def finish_image(record: dict, writer: OutputWriter):
+    """
+    Wait for an image's logos, blend them in detection order and queue the output.
+    
+    A failed logo is left unrestored; the other logos of the image are kept.
+    
+    Returns:
+        Future: The pending output write.
+    """
+    filename = record['filename']
+    full_image = record['image']
+    restored_boxes = []
+    
+    for i, box, mask_rle, future in record['jobs']:
+        try:
+            enhanced_logo = future.result()
+        except CircuitOpenError as e:
+            logger.warning(f"    - Logo {i+1} in {filename} skipped: {e}")
+            continue
+        except Exception as e:
+            logger.error(f"    - Logo {i+1} in {filename} failed, keeping it unrestored: {e}")
+            continue
+        
+        full_image = blend_patch(full_image, enhanced_logo, box, mask_rle)
+        restored_boxes.append(box)
+        logger.info(f"    - Logo {i+1} in {filename} enhanced and integrated")
+    
+    # D. Save final combined image with all enhanced logos (encoded in the background)
+    record['restored'] = len(restored_boxes)
+    final_filename = f"restored_{filename}"
+    final_path = os.path.join(record['output_dir'], os.path.dirname(record['rel_path']), final_filename)
+    logger.info(f"✓ {len(restored_boxes)}/{len(record['jobs'])} logos enhanced in {filename}, queued {final_path} for encoding")
+    return writer.submit(full_image, record['path'], final_path, restored_boxes)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Restore logos in a catalog of images.",
+        epilog="Run `main.py merge OUTPUT/manifest_shard_*.jsonl` after all shards finish to get one run report.",
+    )
+    parser.add_argument('--input', help=f"Input directory, scanned recursively (default {INPUT_DIR})")
+    parser.add_argument('--output', help=f"Output directory (default {OUTPUT_DIR})")
+    parser.add_argument('--shard', help="Process only shard i of N, as i/N with 0 <= i < N (e.g. 0/4)")
+    parser.add_argument('--shard-key', choices=SHARD_KEYS, default='path',
+                        help="Assign images to shards by relative path or by file content hash")
+    parser.add_argument('--no-recursive', action='store_true', help="Only scan the top level of the input directory")
+    commands = parser.add_subparsers(dest='command')
+    merge = commands.add_parser('merge', help="Combine per-shard manifests into one run report")
+    merge.add_argument('manifests', nargs='+', help="Manifest files written by each shard")
+    merge.add_argument('--report', default='run_report.json', help="Where to write the combined report")
+    args = parser.parse_args(argv or [])
+    try:
+        parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def merge(manifests: list, report_path: str) -> dict:
+    """
+    Combine per-shard manifests into one run report and write it as JSON.
+    """
+    report = merge_manifests(manifests)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    logger.info(f"Merged {len(report['shards'])}/{report['shard_count']} shard(s): "
+                f"{report['images']} images, {report['counts']}")
+    if report['missing_or_incomplete_shards']:
+        logger.warning(f"Shards missing or not finished: {report['missing_or_incomplete_shards']}")
+    if report['duplicates']:
+        logger.warning(f"{len(report['duplicates'])} image(s) were processed by more than one shard")
+    logger.info(f"Run report written to {report_path}")
+    return report
+
+def main(argv=None):
     """
     Main orchestrator for the Logo Restoration Pipeline.
+    
+    Args:
+        argv (list, optional): Command-line arguments (see parse_args); the
+            defaults process all of INPUT_DIR into OUTPUT_DIR.
     """
+    args = parse_args(argv)
+    if args.command == 'merge':
+        merge(args.manifests, args.report)
+        return
+    
+    input_dir = args.input or INPUT_DIR
+    output_dir = args.output or OUTPUT_DIR
+    shard_index, shard_count = parse_shard(args.shard)
+    
     logger.info("Starting Logo Restoration Pipeline...")
+    if shard_count > 1:
+        logger.info(f"Shard {shard_index}/{shard_count} (by {args.shard_key})")
     
     # 1. Initialize Detector
     try:
-        if USE_SAM3:
-            detector = SAM3LogoDetector()
-            logger.info("SAM 3 LogoDetector initialized.")
-        else:
-            detector = LogoDetector()
-            logger.info("YOLO LogoDetector initialized.")
+        detector = create_detector()
     except Exception as e:
         logger.error(f"Failed to initialize detector: {e}")
         return
 
-    # 2. Scan Input Directory
-    image_paths = glob.glob(os.path.join(INPUT_DIR, "*.[jJ][pP][gG]")) + \
-                  glob.glob(os.path.join(INPUT_DIR, "*.[pP][nN][gG]")) + \
-                  glob.glob(os.path.join(INPUT_DIR, "*.[jJ][pP][eE][gG]"))
-    
-    if not image_paths:
-        logger.warning(f"No images found in {INPUT_DIR}")
+    # 2. Stream this shard's images from the input directory
+    if not os.path.isdir(input_dir):
+        logger.warning(f"Input directory {input_dir} not found")
         return
-
-    logger.info(f"Found {len(image_paths)} images to process.")
+    images = iter_shard(input_dir, shard_index, shard_count, args.shard_key, recursive=not args.no_recursive)
+    manifest = ShardManifest(manifest_path(output_dir, shard_index, shard_count), shard_index, shard_count, args.shard_key)
 
     # 3. Process Images
-    for img_path in image_paths:
-        filename = os.path.basename(img_path)
-        logger.info(f"Processing {filename}...")
-        
+    # Detection runs ahead while up to MAX_IN_FLIGHT_IMAGES images have logos
+    # waiting on Gemini; the oldest image is finished first.
+    scheduler = LogoScheduler(GEMINI_MAX_CONCURRENCY)
+    writer = OutputWriter(OUTPUT_FORMAT, OUTPUT_QUALITY, OUTPUT_WORKERS)
+    references = {}
+    batcher = AtlasBatcher(
+        scheduler,
+        run_batch=lambda brand_key, items: generate_atlas_patches(items, references[brand_key], brand_key),
+        run_single=lambda brand_key, item: generate_patch(item[0], references[brand_key], brand_key, item[1]),
+        max_logos=ATLAS_MAX_LOGOS,
+    )
+    in_flight = deque()
+    
+    def record_write(record, future):
+        # Runs on the writer thread once the image is encoded
         try:
-            # A. Detect Logo
-            detections = detector.detect_and_crop(img_path)
-            
-            if not detections:
-                logger.info(f"No logos detected in {filename}. Skipping.")
-                continue
-            
-            # Load original image once
-            import cv2
-            from PIL import Image as PILImage
-            full_image = PILImage.open(img_path)
-            
-            # Process each detected logo
-            for i, detection in enumerate(detections):
-                label = detection['label']
-                box = detection['box']
-                confidence = detection['confidence']
-                
-                logger.info(f"  - Detected '{label}' with confidence {confidence:.2f}")
-                
-                # Determine Brand and Reference Asset
-                brand_key = label.lower()
-                
-                # If using SAM 3, it returns generic 'logo', try to infer brand from filename
-                if brand_key == 'logo' and USE_SAM3:
-                    filename_lower = filename.lower()
-                    for brand in BRAND_ASSETS.keys():
-                        if brand in filename_lower:
-                            brand_key = brand
-                            label = brand.upper()
-                            logger.info(f"    - Inferred brand '{brand}' from filename")
-                            break
-                
-                # Check if we have the asset for the detected brand
-                if brand_key not in BRAND_ASSETS:
-                    logger.warning(f"    - Brand '{label}' detected but asset not found in BRAND_ASSETS. Skipping.")
-                    continue
-                
-                reference_logo_path = BRAND_ASSETS.get(brand_key)
-                if not reference_logo_path or not os.path.exists(reference_logo_path):
-                    logger.warning(f"    - Reference asset for '{brand_key}' not found at {reference_logo_path}. Skipping.")
-                    continue
-
-                # B. Generate Clinical Mask
-                mask_filename = f"mask_{filename}_{i}.png"
-                mask_path = os.path.join(OUTPUT_DIR, "masks", mask_filename)
-                
-                temp_img = cv2.imread(img_path)
-                if temp_img is None:
-                     logger.error(f"    - Failed to read image {img_path}. Skipping.")
-                     continue
-                
-                create_clinical_mask(temp_img.shape, box, mask_path)
-                logger.info(f"    - Clinical Mask (dilated) generated at {mask_path}")
-                
-                # C. Restore Logo (enhance and paste into full_image)
-                # Save to temp location
-                temp_output = os.path.join(OUTPUT_DIR, f"temp_{i}_{filename}")
-                
-                # Save current full_image state
-                full_image.save(temp_output.replace('.jpg', '_input.jpg'))
-                
-                # Enhance this logo
-                restore_logo(temp_output.replace('.jpg', '_input.jpg'), mask_path, reference_logo_path, brand_key, box, temp_output)
-                
-                # Load the enhanced result as the new full_image
-                full_image = PILImage.open(temp_output)
-                logger.info(f"    - Logo {i+1} enhanced and integrated")
-            
-            # D. Save final combined image with all enhanced logos
-            final_filename = f"restored_{filename}"
-            final_path = os.path.join(OUTPUT_DIR, final_filename)
-            full_image.save(final_path)
-            logger.info(f"✓ All logos enhanced and saved to {final_path}")
-
+            output = future.result()
+            logger.info(f"✓ Saved {output}")
+            status = 'restored' if record['restored'] else 'unrestored'
+            manifest.record(record['rel_path'], status, output=output,
+                            logos=len(record['jobs']), restored=record['restored'],
+                            detections=record['detections'])
         except Exception as e:
-            logger.error(f"Error processing {filename}: {e}")
+            logger.error(f"Error writing output for {record['filename']}: {e}")
+            manifest.record(record['rel_path'], 'error', logos=len(record['jobs']), error=str(e))
+    
+    def finish_oldest():
+        # Partially filled atlases holding this image's logos must go out
+        # before we wait on them; other groups keep filling
+        record = in_flight.popleft()
+        batcher.flush_for([job[-1] for job in record['jobs']])
+        try:
+            future = finish_image(record, writer)
+        except Exception as e:
+            logger.error(f"Error processing {record['filename']}: {e}")
+            manifest.record(record['rel_path'], 'error', logos=len(record['jobs']), error=str(e))
+            return
+        future.add_done_callback(lambda f: record_write(record, f))
+    
+    for img_path, rel_path in images:
+        try:
+            record = queue_image(img_path, detector, batcher, references, rel_path, output_dir)
+        except Exception as e:
+            logger.error(f"Error processing {rel_path}: {e}")
+            manifest.record(rel_path, 'error', error=str(e))
             continue
+        if record:
+            in_flight.append(record)
+        else:
+            manifest.record(rel_path, 'no_logos', logos=0)
+        while len(in_flight) > MAX_IN_FLIGHT_IMAGES:
+            finish_oldest()
+    
+    while in_flight:
+        finish_oldest()
+    scheduler.close()
 
+    # Wait for the encoder pool to finish
+    writer.close()
+    manifest.close()
+
+    if not manifest.counts:
+        logger.warning(f"No images found in {input_dir} for this shard")
+        return
     logger.info("=== Pipeline Execution Completed Successfully ===")
-    logger.info(f"Outputs saved to {OUTPUT_DIR}")
+    logger.info(f"{sum(manifest.counts.values())} images: {manifest.counts}")
+    logger.info(f"Outputs saved to {output_dir}, manifest {manifest.path}")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -2,14 +2,101 @@ import cv2
 import numpy as np
 import os
 
-def create_clinical_mask(image_shape: tuple, box: list, output_path: str = None) -> str:
+def encode_mask_rle(mask: np.ndarray) -> dict:
     """
-    Create a clinical elliptical mask for the detected logo.
+    Run-length encode a box-local binary mask.
+    
+    Args:
+        mask (np.ndarray): (h, w) mask, non-zero inside the logo.
+        
+    Returns:
+        dict: {'size': [h, w], 'counts': [...]}, JSON-serializable. Counts
+        alternate background/foreground runs in row-major order, starting
+        with background (so the first count may be 0).
+    """
+    flat = (np.asarray(mask) > 0).ravel()
+    if flat.size == 0:
+        return {'size': list(mask.shape[:2]), 'counts': []}
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [flat.size])))
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {'size': [int(mask.shape[0]), int(mask.shape[1])], 'counts': counts.tolist()}
+
+def decode_mask_rle(rle: dict) -> np.ndarray:
+    """
+    Decode a mask from encode_mask_rle.
+    
+    Returns:
+        np.ndarray: (h, w) uint8 mask, 255 inside the logo.
+    """
+    h, w = rle['size']
+    counts = np.asarray(rle['counts'], dtype=np.int64)
+    values = np.zeros(len(counts), np.uint8)
+    values[1::2] = 255
+    return np.repeat(values, counts).reshape(h, w)
+
+def _dilate(mask: np.ndarray, w: int, h: int) -> np.ndarray:
+    # Apply dilation to the mask to slightly expand the area for better blending
+    # This helps in reducing the "halo" effect or sharp edges during Poisson blending
+    # We use a small kernel for subtle dilation
+    kernel_size = int(max(w, h) * 0.02) # 2% of the object size
+    kernel_size = max(3, kernel_size) # Minimum 3x3
+    if kernel_size % 2 == 0: kernel_size += 1 # Ensure odd kernel size
+    
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    return cv2.dilate(mask, kernel, iterations=1)
+
+def create_local_mask(box: list, mask_rle: dict = None) -> np.ndarray:
+    """
+    Create the clinical mask for a logo, local to its box.
+    
+    Args:
+        box (list): The bounding box [x, y, w, h].
+        mask_rle (dict, optional): Box-local segmentation from the detector
+            (see encode_mask_rle). Without it the logo is approximated by an ellipse.
+        
+    Returns:
+        np.ndarray: (h, w) uint8 mask, 255 where the logo should be blended.
+    """
+    x, y, w, h = box
+    
+    if mask_rle is not None:
+        mask = decode_mask_rle(mask_rle)
+        if mask.shape != (h, w):
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        return _dilate(mask, w, h)
+    
+    mask = np.zeros((h, w), dtype=np.uint8)
+    
+    # Calculate center and axes for ellipse
+    center = (w // 2, h // 2)
+    
+    # Apply 10% reduction in mask size (0.9 * w) to ensure we only target the logo interior
+    # We apply this reduction to both axes to maintain aspect ratio relative to the box
+    # The prompt specifies 0.9 * w, let's apply it to both axes for the ellipse
+    axes = (int((w * 0.9) / 2), int((h * 0.9) / 2))
+    
+    angle = 0
+    startAngle = 0
+    endAngle = 360
+    
+    # Draw the ellipse
+    # 255 is white (foreground), 0 is black (background)
+    cv2.ellipse(mask, center, axes, angle, startAngle, endAngle, 255, -1)
+    
+    return _dilate(mask, w, h)
+
+def create_clinical_mask(image_shape: tuple, box: list, output_path: str = None, mask_rle: dict = None) -> str:
+    """
+    Create a clinical mask for the detected logo.
     
     Args:
         image_shape (tuple): The shape of the original image (height, width, channels).
         box (list): The bounding box [x, y, w, h].
         output_path (str, optional): Path to save the mask image. If None, returns the mask array.
+        mask_rle (dict, optional): Box-local segmentation from the detector;
+            an ellipse is used if it is missing.
         
     Returns:
         str: Path to the saved mask image.
@@ -19,32 +106,13 @@ def create_clinical_mask(image_shape: tuple, box: list, output_path: str = None)
         mask = np.zeros((height, width), dtype=np.uint8)
         
         x, y, w, h = box
+        local = create_local_mask(box, mask_rle)
         
-        # Calculate center and axes for ellipse
-        center = (x + w // 2, y + h // 2)
-        
-        # Apply 10% reduction in mask size (0.9 * w) to ensure we only target the logo interior
-        # We apply this reduction to both axes to maintain aspect ratio relative to the box
-        # The prompt specifies 0.9 * w, let's apply it to both axes for the ellipse
-        axes = (int((w * 0.9) / 2), int((h * 0.9) / 2))
-        
-        angle = 0
-        startAngle = 0
-        endAngle = 360
-        
-        # Draw the ellipse
-        # 255 is white (foreground), 0 is black (background)
-        cv2.ellipse(mask, center, axes, angle, startAngle, endAngle, 255, -1)
-        
-        # Apply dilation to the mask to slightly expand the area for better blending
-        # This helps in reducing the "halo" effect or sharp edges during Poisson blending
-        # We use a small kernel for subtle dilation
-        kernel_size = int(max(w, h) * 0.02) # 2% of the object size
-        kernel_size = max(3, kernel_size) # Minimum 3x3
-        if kernel_size % 2 == 0: kernel_size += 1 # Ensure odd kernel size
-        
-        kernel = np.ones((kernel_size, kernel_size), np.uint8)
-        mask = cv2.dilate(mask, kernel, iterations=1)
+        # Paste the box-local mask, clipped to the frame
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 > x0 and y1 > y0:
+            mask[y0:y1, x0:x1] = local[y0 - y:y1 - y, x0 - x:x1 - x]
         
         if output_path:
             # Ensure directory exists
@@ -0,0 +1,355 @@
+"""
+ONNX Runtime detector backend - CPU-friendly alternative to LogoDetector.
+
+Runs the same YOLO weights exported to ONNX, optionally quantized to INT8 and
+calibrated on our own images. Pre- and post-processing (letterbox, NMS) are
+plain NumPy/OpenCV, so neither PyTorch nor ultralytics is needed at inference
+time; ultralytics is only used once, for the export.
+
+Usage:
+    python onnx_detector.py export --model yolo11n.pt
+    python onnx_detector.py quantize yolo11n.onnx --calibration-dir ./input
+    DETECTOR_BACKEND=onnx ONNX_MODEL_PATH=yolo11n.int8.onnx python main.py
+"""
+import os
+import ast
+import logging
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+import cv2
+import numpy as np
+
+from detector import infer_brand_label
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Same thresholds as LogoDetector / ultralytics predict()
+CONF_THRESHOLD = 0.15
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+# Boxes are offset by class * MAX_WH so one NMS pass never suppresses across classes
+MAX_WH = 7680
+# Highest-scoring candidates considered by NMS; bounds the (N, N) IoU matrix
+MAX_NMS_CANDIDATES = 3000
+
+
+def letterbox(image: np.ndarray, size: int = 640, pad_value: int = 114):
+    """
+    Resize keeping aspect ratio and pad to size x size, like ultralytics.
+
+    Returns:
+        tuple: (padded HWC uint8 image, scale, (pad_x, pad_y)).
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    left, top = round(pad_x - 0.1), round(pad_y - 0.1)
+    padded = np.full((size, size, 3), pad_value, np.uint8)
+    padded[top:top + new_h, left:left + new_w] = image
+    return padded, scale, (left, top)
+
+
+def preprocess(image_bgr: np.ndarray, size: int = 640):
+    """
+    BGR image -> (1, 3, size, size) float32 RGB tensor in [0, 1].
+
+    Returns:
+        tuple: (tensor, scale, (pad_x, pad_y)).
+    """
+    padded, scale, pad = letterbox(image_bgr, size)
+    tensor = np.ascontiguousarray(padded[..., ::-1].transpose(2, 0, 1)[None], dtype=np.float32)
+    tensor *= 1.0 / 255.0
+    return tensor, scale, pad
+
+
+def box_iou(boxes: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) xyxy boxes, as an (N, N) matrix."""
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    lt = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    return inter / np.maximum(area[:, None] + area[None, :] - inter, 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = IOU_THRESHOLD,
+        max_detections: int = MAX_DETECTIONS) -> np.ndarray:
+    """
+    Greedy non-maximum suppression.
+
+    The IoU matrix is computed once for all candidates; the greedy pass then
+    only ORs precomputed rows, one per kept box.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, highest score first.
+    """
+    order = np.argsort(-scores, kind='stable')
+    iou = box_iou(boxes[order])
+    suppressed = np.zeros(len(order), bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(order[i])
+        if len(keep) >= max_detections:
+            break
+        suppressed |= iou[i] > iou_threshold
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output: np.ndarray, scale: float, pad: tuple, image_shape: tuple,
+                conf_threshold: float = CONF_THRESHOLD, iou_threshold: float = IOU_THRESHOLD):
+    """
+    Decode a YOLO (1, 4 + classes, anchors) output into image-space detections.
+
+    Returns:
+        tuple: (xyxy boxes (N, 4), scores (N,), class ids (N,)).
+    """
+    preds = output[0].T
+    class_scores = preds[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(preds)), class_ids]
+
+    candidates = scores > conf_threshold
+    preds, scores, class_ids = preds[candidates], scores[candidates], class_ids[candidates]
+    if not len(preds):
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)
+
+    # Keep the best candidates only, so the IoU matrix stays small
+    if len(scores) > MAX_NMS_CANDIDATES:
+        top = np.argpartition(-scores, MAX_NMS_CANDIDATES)[:MAX_NMS_CANDIDATES]
+        preds, scores, class_ids = preds[top], scores[top], class_ids[top]
+
+    cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    keep = nms(boxes + class_ids[:, None] * MAX_WH, scores, iou_threshold)
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+    # Undo the letterbox
+    boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], np.float32)
+    boxes /= scale
+    height, width = image_shape[:2]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    return boxes, scores, class_ids
+
+
+class OnnxLogoDetector:
+    """
+    Logo detector running YOLO weights with ONNX Runtime.
+
+    Drop-in replacement for LogoDetector: detect_and_crop returns the same
+    [{'label', 'box': [x, y, w, h], 'confidence'}] list.
+    """
+
+    def __init__(self, model_path: str = 'yolo11n.onnx', conf: float = CONF_THRESHOLD, iou: float = IOU_THRESHOLD,
+                 threads: int = None):
+        """
+        Args:
+            model_path (str): Exported (optionally INT8) ONNX model.
+            conf (float): Confidence threshold.
+            iou (float): NMS IoU threshold.
+            threads (int, optional): Intra-op threads; ONNX Runtime picks if None.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed. Run: pip install onnxruntime")
+
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"ONNX model not found at {model_path}. Create it with: python onnx_detector.py export")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        try:
+            self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        except Exception as e:
+            raise RuntimeError(f"Failed to load ONNX model from {model_path}: {e}")
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.size = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        self.conf = conf
+        self.iou = iou
+
+        # ultralytics stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+
+    def detect(self, image_bgr: np.ndarray):
+        """
+        Run the model on a BGR image.
+
+        Returns:
+            tuple: (xyxy boxes (N, 4), scores (N,), class ids (N,)).
+        """
+        tensor, scale, pad = preprocess(image_bgr, self.size)
+        output = self.session.run(None, {self.input_name: tensor})[0]
+        return postprocess(output, scale, pad, image_bgr.shape, self.conf, self.iou)
+
+    def detect_and_crop(self, image_path: str) -> List[Dict[str, Any]]:
+        """
+        Detect logos in an image and return their bounding boxes and labels.
+
+        Args:
+            image_path (str): Path to the input image.
+
+        Returns:
+            List[Dict[str, Any]]: A list of dictionaries containing:
+                - 'label': The detected brand name (or 'Unknown').
+                - 'box': The bounding box [x, y, w, h].
+                - 'confidence': The confidence score.
+        """
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image not found at {image_path}")
+
+        try:
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Could not decode {image_path}")
+            boxes, scores, class_ids = self.detect(image)
+
+            detections = []
+            for (x1, y1, x2, y2), conf, cls_id in zip(boxes.tolist(), scores.tolist(), class_ids.tolist()):
+                label = self.names.get(cls_id, str(cls_id))
+                detections.append({
+                    'label': infer_brand_label(label, image_path),
+                    'box': [int(x1), int(y1), int(x2 - x1), int(y2 - y1)],
+                    'confidence': float(conf)
+                })
+            return detections
+
+        except Exception as e:
+            print(f"Error during detection on {image_path}: {e}")
+            return []
+
+
+def export_onnx(model_path: str = 'yolo11n.pt', imgsz: int = 640, opset: int = None) -> str:
+    """
+    Export YOLO weights to ONNX with ultralytics (static 1x3ximgszximgsz input).
+
+    Returns:
+        str: Path to the .onnx file (next to the weights).
+    """
+    from ultralytics import YOLO
+
+    kwargs = {'format': 'onnx', 'imgsz': imgsz, 'dynamic': False, 'simplify': True}
+    if opset:
+        kwargs['opset'] = opset
+    return str(YOLO(model_path).export(**kwargs))
+
+
+class _CalibrationReader:
+    """Feeds letterboxed calibration images to quantize_static, one at a time."""
+
+    def __init__(self, image_paths: list, input_name: str, size: int):
+        self.image_paths = iter(image_paths)
+        self.input_name = input_name
+        self.size = size
+
+    def get_next(self):
+        for path in self.image_paths:
+            image = cv2.imread(path)
+            if image is None:
+                logger.warning(f"Could not read calibration image {path}, skipping")
+                continue
+            return {self.input_name: preprocess(image, self.size)[0]}
+        return None
+
+
+def _head_nodes(model_path: str) -> list:
+    """
+    Names of the nodes in the final Detect layer (/model.<last>/...).
+
+    The box decoding there is very sensitive to quantization error, so it is
+    kept in float.
+    """
+    import onnx
+
+    graph = onnx.load(model_path).graph
+    layers = {}
+    for node in graph.node:
+        parts = node.name.split('/')
+        if len(parts) > 1 and parts[1].startswith('model.') and parts[1][6:].isdigit():
+            layers.setdefault(int(parts[1][6:]), []).append(node.name)
+    return layers[max(layers)] if layers else []
+
+
+def quantize_int8(model_path: str, calibration_dir: str, output_path: str = None, max_images: int = 200,
+                  per_channel: bool = True) -> str:
+    """
+    Statically quantize an exported model to INT8 (QDQ), calibrated on our images.
+
+    Args:
+        model_path (str): FP32 ONNX model from export_onnx.
+        calibration_dir (str): Directory of representative catalog images.
+        output_path (str, optional): Defaults to <model>.int8.onnx.
+        max_images (int): Calibration images to use (sorted by name).
+        per_channel (bool): Per-channel weight scales (better accuracy).
+
+    Returns:
+        str: Path to the quantized model.
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    output_path = output_path or os.path.splitext(model_path)[0] + '.int8.onnx'
+    names = sorted(e.name for e in os.scandir(calibration_dir)
+                   if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))[:max_images]
+    if not names:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+
+    model_input = ort.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_inputs()[0]
+    reader = _CalibrationReader([os.path.join(calibration_dir, n) for n in names], model_input.name, model_input.shape[2])
+
+    with tempfile.TemporaryDirectory(prefix='quantize_') as tmp_dir:
+        # Shape inference and graph cleanup give the quantizer a better graph to work on
+        prepared = os.path.join(tmp_dir, 'prepared.onnx')
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            quant_pre_process(model_path, prepared)
+        except Exception as e:
+            logger.warning(f"Quantization pre-processing failed, quantizing the model as exported: {e}")
+            prepared = model_path
+
+        logger.info(f"Calibrating INT8 quantization on {len(names)} image(s) from {calibration_dir}")
+        quantize_static(
+            prepared, output_path, reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=_head_nodes(prepared),
+        )
+    logger.info(f"INT8 model written to {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export YOLO weights to ONNX and quantize them to INT8.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Export YOLO .pt weights to ONNX")
+    export.add_argument('--model', default='yolo11n.pt')
+    export.add_argument('--imgsz', type=int, default=640)
+    quantize = commands.add_parser('quantize', help="INT8-quantize an ONNX model, calibrated on our images")
+    quantize.add_argument('model', help="FP32 ONNX model")
+    quantize.add_argument('--calibration-dir', default='./input')
+    quantize.add_argument('--max-images', type=int, default=200)
+    quantize.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f"ONNX model written to {export_onnx(args.model, args.imgsz)}")
+    else:
+        quantize_int8(args.model, args.calibration_dir, args.output, args.max_images)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to an in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), 'logo_pipeline_gemini_limiter.json')
+
+
+class SharedRateLimiter:
+    """
+    A token-bucket rate limiter shared by every thread and process on a machine.
+
+    The bucket lives in a small JSON file guarded by an exclusive flock, so
+    several pipeline workers pointing at the same state file share one quota.
+    It enforces both a requests-per-minute rate (with `burst` tokens of
+    headroom) and a cap on concurrent in-flight requests; either can be
+    disabled with 0. In-flight slots are leases with an expiry, so a crashed
+    worker can't hold a slot forever.
+    """
+
+    def __init__(self, requests_per_minute: float, max_concurrency: int = 4, burst: Optional[int] = None,
+                 state_path: str = DEFAULT_STATE_PATH, lease_timeout: float = 300.0):
+        """
+        Initialize the SharedRateLimiter.
+
+        Args:
+            requests_per_minute (float): Sustained request rate across all
+                workers; 0 only caps concurrency.
+            max_concurrency (int): Maximum requests in flight across all
+                workers; 0 only limits the rate.
+            burst (int, optional): Bucket capacity. Defaults to max_concurrency.
+            state_path (str): Path of the shared state file.
+            lease_timeout (float): Seconds after which an unreleased slot is reclaimed.
+        """
+        self.rate = requests_per_minute / 60.0
+        self.max_concurrency = max_concurrency
+        self.capacity = float(burst or max_concurrency or 1)
+        self.state_path = state_path
+        self.lease_timeout = lease_timeout
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the shared state dict under an exclusive lock and write it back."""
+        with self._thread_lock:
+            with open(self.state_path, 'a+') as f:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw else {}
+                    except ValueError:
+                        logger.warning(f"Corrupt limiter state in {self.state_path}, resetting")
+                        state = {}
+                    state.setdefault('tokens', self.capacity)
+                    state.setdefault('updated', time.time())
+                    state.setdefault('leases', {})
+
+                    yield state
+
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(state, f)
+                    f.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state['updated'])
+        state['tokens'] = min(self.capacity, state['tokens'] + elapsed * self.rate)
+        state['updated'] = now
+        state['leases'] = {k: v for k, v in state['leases'].items() if v > now}
+
+    def try_acquire(self) -> tuple:
+        """
+        Try to take a token and an in-flight slot without blocking.
+
+        Returns:
+            tuple: (lease_id, 0.0) on success, or (None, seconds_to_wait).
+        """
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            if self.max_concurrency > 0 and len(state['leases']) >= self.max_concurrency:
+                # Slots free up on release(); poll until then
+                return None, 0.05
+            if self.rate > 0:
+                if state['tokens'] < 1.0:
+                    return None, (1.0 - state['tokens']) / self.rate
+                state['tokens'] -= 1.0
+            lease_id = uuid.uuid4().hex
+            state['leases'][lease_id] = now + self.lease_timeout
+            return lease_id, 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """
+        Block until a request may be sent.
+
+        Args:
+            timeout (float, optional): Give up after this many seconds.
+
+        Returns:
+            str: Lease id to hand back to release().
+        """
+        start = time.monotonic()
+        while True:
+            lease_id, wait_for = self.try_acquire()
+            if lease_id:
+                return lease_id
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a Gemini rate limit slot")
+                wait_for = min(wait_for, remaining)
+            time.sleep(wait_for)
+
+    def release(self, lease_id: str):
+        """Return an in-flight slot."""
+        with self._locked_state() as state:
+            state['leases'].pop(lease_id, None)
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """Context manager holding one rate-limited request slot."""
+        lease_id = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(lease_id)
+
+
+if __name__ == "__main__":
+    print("Rate limiter module ready.")
@@ -0,0 +1,255 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Attempts that hit their deadline keep running in the background (threads
+# can't be cancelled), so the pool is sized to absorb a few of them. This only
+# holds if the call itself gives up: the Gemini client is created with an
+# HTTP timeout equal to the attempt timeout.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='gemini-call')
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the circuit breaker is open and calls are being shed."""
+
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a call (including its retries) runs past its deadline."""
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call fails fast with CircuitOpenError. Once `reset_timeout` seconds have
+    passed, a single trial call is let through (half-open): success closes the
+    breaker, failure opens it again. A client-side error leaves the state
+    alone and lets the next call be the trial.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            failure_threshold (int): Consecutive failures before opening.
+            reset_timeout (float): Seconds to stay open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call should be shed."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit breaker is open, Gemini API looks degraded")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Circuit breaker is half-open, trial call in flight")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        End a call that says nothing about API health.
+
+        The half-open trial slot is handed back so another call can probe;
+        the state and failure count are left unchanged.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether an error from the Gemini client is worth retrying.
+
+    Rate limits, server errors, timeouts and connection problems are retried;
+    anything else (bad request, auth, a text-only answer) is not.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, DeadlineExceededError)):
+        return True
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    # httpx transport errors and timeouts (used by google-genai) don't carry a status code
+    name = type(error).__name__
+    return type(error).__module__.startswith('httpx') and ('Error' in name or 'Timeout' in name)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(max_delay, base * 2^attempt)].
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def _run_attempt(fn: Callable[[], Any], timeout: float, hedge_after: Optional[float],
+                 limiter=None, lease: Optional[str] = None) -> Any:
+    """
+    Run one attempt of `fn`, optionally hedged with a second concurrent call.
+
+    If the first call hasn't finished after `hedge_after` seconds, a duplicate
+    is started and whichever succeeds first wins. Only fails if every launched
+    call fails or `timeout` elapses.
+
+    With a limiter, `lease` is the slot already taken for the first call; the
+    hedged call only goes out if another slot is free right away. Each slot is
+    released when its call actually returns, so calls that outlive the
+    attempt keep counting against the limit. Calls still queued when the
+    attempt gives up are never sent.
+    """
+    abandoned = threading.Event()
+
+    def run(lease):
+        try:
+            if abandoned.is_set():
+                raise DeadlineExceededError("Attempt abandoned before the request was sent")
+            return fn()
+        finally:
+            if lease is not None:
+                limiter.release(lease)
+
+    start = time.monotonic()
+    futures = {_executor.submit(run, lease)}
+    hedged = hedge_after is None or hedge_after >= timeout
+    last_error = None
+
+    while futures:
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            break
+        wait_for = timeout - elapsed
+        if not hedged:
+            wait_for = min(wait_for, max(0.0, hedge_after - elapsed))
+
+        done, futures = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                last_error = e
+
+        if not hedged and time.monotonic() - start >= hedge_after:
+            hedged = True
+            try:
+                hedge_lease = limiter.acquire(timeout=0) if limiter else None
+            except TimeoutError:
+                logger.info(f"No response after {hedge_after:.1f}s, but no rate limit slot free for a hedged request")
+                continue
+            logger.info(f"No response after {hedge_after:.1f}s, sending hedged request")
+            futures.add(_executor.submit(run, hedge_lease))
+
+    abandoned.set()
+    if futures:
+        raise DeadlineExceededError(f"Call did not complete within {timeout:.1f}s")
+    raise last_error
+
+
+def call_with_resilience(fn: Callable[[], Any], deadline: float = 120.0, attempt_timeout: float = 60.0,
+                         max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                         hedge_after: Optional[float] = None,
+                         breaker: Optional[CircuitBreaker] = None, limiter=None) -> Any:
+    """
+    Call `fn` with deadlines, jittered exponential backoff, hedging and a circuit breaker.
+
+    Args:
+        fn (Callable): Zero-argument callable performing the request.
+        deadline (float): Total seconds allowed across all attempts and backoff.
+        attempt_timeout (float): Seconds allowed for a single attempt.
+        max_attempts (int): Maximum number of attempts.
+        base_delay (float): Base backoff delay in seconds.
+        max_delay (float): Cap on a single backoff delay in seconds.
+        hedge_after (float, optional): Send a duplicate request if an attempt
+            hasn't returned after this many seconds. None disables hedging.
+        breaker (CircuitBreaker, optional): Shared breaker to consult/update.
+        limiter (optional): Rate limiter with acquire(timeout)/release(lease),
+            e.g. SharedRateLimiter. A slot is taken before each attempt's
+            timer starts; waiting for it counts against `deadline` only, and
+            running out of time while waiting is not reported to the breaker.
+
+    Returns:
+        Any: The return value of `fn`.
+    """
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        # Shed before taking a slot, so calls refused by an open breaker
+        # don't queue for the limiter or spend its tokens
+        if breaker:
+            breaker.before_call()
+        lease = None
+        if limiter:
+            try:
+                lease = limiter.acquire(timeout=max(0.0, deadline - (time.monotonic() - start)))
+            except TimeoutError as e:
+                if breaker:
+                    breaker.release_trial()
+                raise DeadlineExceededError(f"Deadline of {deadline:.1f}s exceeded after {attempt} attempt(s): {e}")
+
+        remaining = deadline - (time.monotonic() - start)
+        try:
+            result = _run_attempt(fn, min(attempt_timeout, remaining), hedge_after, limiter, lease)
+        except Exception as e:
+            if breaker and is_retryable(e):
+                breaker.record_failure()
+            elif breaker:
+                # Client-side errors say nothing about API health
+                breaker.release_trial()
+            attempt += 1
+            if not is_retryable(e) or attempt >= max_attempts:
+                raise
+            delay = backoff_delay(attempt - 1, base_delay, max_delay)
+            if time.monotonic() - start + delay >= deadline:
+                raise DeadlineExceededError(f"Deadline of {deadline:.1f}s exceeded after {attempt} attempt(s): {e}")
+            logger.warning(f"Attempt {attempt}/{max_attempts} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+if __name__ == "__main__":
+    print("Resilience module ready.")
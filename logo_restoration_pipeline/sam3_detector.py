@@ -6,6 +6,8 @@ from sam3.model.sam3_image_processor import Sam3Processor
 from PIL import Image
 import numpy as np
 
+from masker import encode_mask_rle
+
 class SAM3LogoDetector:
     """Logo detector using SAM 3 with text prompts."""
     
@@ -25,7 +27,9 @@ class SAM3LogoDetector:
             
         Returns:
             List of detections with format:
-            [{'label': 'logo', 'box': [x, y, w, h], 'confidence': float}]
+            [{'label': 'logo', 'box': [x, y, w, h], 'confidence': float, 'mask': rle}]
+            where 'mask' is the segmentation cropped to the box and
+            run-length encoded (see masker.encode_mask_rle).
         """
         # Load image
         image = Image.open(image_path)
@@ -41,15 +45,22 @@ class SAM3LogoDetector:
         
         detections = []
         for i, (mask, box, score) in enumerate(zip(masks, boxes, scores)):
-            # Convert box format from [x1, y1, x2, y2] to [x, y, w, h]
-            box_np = box.cpu().numpy().astype(int)
-            x1, y1, x2, y2 = box_np
+            # Convert box format from [x1, y1, x2, y2] to [x, y, w, h], inside the image
+            x1, y1, x2, y2 = box.float().cpu().numpy().astype(int).tolist()
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(image.width, x2), min(image.height, y2)
             x, y, w, h = x1, y1, x2 - x1, y2 - y1
+            if w <= 0 or h <= 0:
+                continue
+            
+            # Keep only the box-local part of the full-frame mask
+            local_mask = mask.reshape(mask.shape[-2:])[y1:y2, x1:x2].cpu().numpy()
             
             detections.append({
                 'label': 'logo',
                 'box': [x, y, w, h],
-                'confidence': float(score)
+                'confidence': float(score),
+                'mask': encode_mask_rle(local_mask)
             })
             print(f"  - Detected 'logo' with confidence {float(score):.2f}")
         
@@ -0,0 +1,202 @@
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+from resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class LogoScheduler:
+    """
+    A priority scheduler for pending logo generation jobs.
+
+    Jobs are run by a fixed set of worker threads in priority order: earliest
+    image deadline first, then highest detection confidence, then largest box
+    area. Workers block on the shared rate limiter inside the job, so keeping
+    the queue full lets the pipeline run at the quota ceiling while the most
+    urgent logos go first.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Initialize the LogoScheduler.
+
+        Args:
+            max_workers (int): Number of worker threads. Match this to the
+                limiter's max_concurrency.
+        """
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker, name=f'logo-scheduler-{i}', daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @staticmethod
+    def priority(confidence: float, box: list, deadline: float) -> tuple:
+        """Sort key for a job: lower sorts first."""
+        area = box[2] * box[3]
+        return (deadline, -confidence, -area)
+
+    def submit(self, fn: Callable[[], Any], confidence: float, box: list, deadline: float) -> Future:
+        """
+        Queue a job.
+
+        Args:
+            fn (Callable): Zero-argument callable doing the work.
+            confidence (float): Detection confidence of the logo.
+            box (list): The [x, y, w, h] box of the logo.
+            deadline (float): time.time() by which the image should be done.
+
+        Returns:
+            Future: Resolves to the return value of `fn`.
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            heapq.heappush(self._heap, (self.priority(confidence, box, deadline), next(self._counter), fn, future))
+            self._cond.notify()
+        return future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, fn, future = heapq.heappop(self._heap)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def close(self):
+        """Finish all queued jobs and stop the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AtlasBatcher:
+    """
+    Groups pending logo jobs by brand so several crops share one request.
+
+    Items added under the same key are collected until `max_logos` are
+    waiting (or flush() is called) and then submitted to the scheduler as one
+    batch job. If the batch request fails for any reason other than an open
+    circuit breaker, the items are retried one by one so a bad atlas doesn't
+    cost the logos. With max_logos=1 every item is submitted on its own.
+    """
+
+    def __init__(self, scheduler: LogoScheduler, run_batch: Callable[[Hashable, list], list],
+                 run_single: Callable[[Hashable, Any], Any], max_logos: int = 4):
+        """
+        Initialize the AtlasBatcher.
+
+        Args:
+            scheduler (LogoScheduler): Scheduler that runs the jobs.
+            run_batch (Callable): run_batch(key, items) -> one result per item.
+            run_single (Callable): run_single(key, item) -> result.
+            max_logos (int): Maximum items per batch.
+        """
+        self.scheduler = scheduler
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_logos = max(1, max_logos)
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, item: Any, confidence: float, box: list, deadline: float) -> Future:
+        """
+        Queue one item under a group key.
+
+        Returns:
+            Future: Resolves to the result for this item.
+        """
+        future = Future()
+        with self._lock:
+            group = self._groups.setdefault(key, [])
+            group.append((item, confidence, box, deadline, future))
+            full = len(group) >= self.max_logos
+        if full:
+            self.flush(key)
+        return future
+
+    def flush(self, key: Hashable = None):
+        """Submit the pending items of one group, or of all groups if key is None."""
+        with self._lock:
+            keys = list(self._groups) if key is None else [key]
+            groups = [(k, self._groups.pop(k)) for k in keys if self._groups.get(k)]
+
+        for k, group in groups:
+            # A batch runs with the priority of its most urgent member
+            confidence = max(entry[1] for entry in group)
+            box = max((entry[2] for entry in group), key=lambda b: b[2] * b[3])
+            deadline = min(entry[3] for entry in group)
+            self.scheduler.submit(lambda k=k, group=group: self._run(k, group), confidence, box, deadline)
+
+    def flush_for(self, futures: list):
+        """
+        Submit only the groups that still hold any of `futures`.
+
+        Used before waiting on specific items, so other partially filled
+        groups keep collecting items from later images.
+        """
+        wanted = set(futures)
+        with self._lock:
+            keys = [k for k, group in self._groups.items() if any(entry[4] in wanted for entry in group)]
+        for key in keys:
+            self.flush(key)
+
+    def _run(self, key: Hashable, group: list):
+        items = [entry[0] for entry in group]
+        futures = [entry[4] for entry in group]
+
+        if len(items) > 1:
+            try:
+                results = self.run_batch(key, items)
+            except CircuitOpenError as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            except Exception as e:
+                logger.warning(f"Batch of {len(items)} for '{key}' failed ({e}), retrying one by one")
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+                return
+
+        for item, future in zip(items, futures):
+            try:
+                future.set_result(self.run_single(key, item))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+if __name__ == "__main__":
+    print("Scheduler module ready.")
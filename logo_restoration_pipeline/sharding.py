@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+SHARD_KEYS = ('path', 'content')
+
+
+def parse_shard(spec: Optional[str]) -> tuple:
+    """
+    Parse a shard spec "i/N" (0-based, 0 <= i < N).
+
+    Returns:
+        tuple: (index, count); (0, 1) if spec is None.
+    """
+    if not spec:
+        return 0, 1
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N such as 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}': need 0 <= i < N")
+    return index, count
+
+
+def shard_for(path: str, rel_path: str, count: int, key: str = 'path') -> int:
+    """
+    Deterministically assign an image to one of `count` shards.
+
+    With key='path' the hash covers the path relative to the input root
+    (with '/' separators), so every node agrees regardless of mount point.
+    With key='content' it covers the file bytes, so renamed or moved files
+    stay on the same shard.
+    """
+    if count == 1:
+        return 0
+    digest = hashlib.sha1()
+    if key == 'content':
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        digest.update(rel_path.encode('utf-8'))
+    return int(digest.hexdigest()[:16], 16) % count
+
+
+def iter_images(input_dir: str, recursive: bool = True) -> Iterator[tuple]:
+    """
+    Stream image files under input_dir with os.scandir.
+
+    Yields:
+        tuple: (path, rel_path) where rel_path uses '/' separators.
+    """
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(input_dir, rel_dir))
+        except OSError as e:
+            logger.warning(f"Cannot scan {os.path.join(input_dir, rel_dir)}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir():
+                    if recursive:
+                        stack.append(rel_path)
+                elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path, rel_path
+
+
+def iter_shard(input_dir: str, index: int = 0, count: int = 1, key: str = 'path', recursive: bool = True) -> Iterator[tuple]:
+    """Stream the (path, rel_path) pairs that belong to shard index/count."""
+    for path, rel_path in iter_images(input_dir, recursive):
+        if shard_for(path, rel_path, count, key) == index:
+            yield path, rel_path
+
+
+def manifest_path(output_dir: str, index: int = 0, count: int = 1) -> str:
+    if count == 1:
+        return os.path.join(output_dir, "manifest.jsonl")
+    return os.path.join(output_dir, f"manifest_shard_{index:03d}_of_{count:03d}.jsonl")
+
+
+class ShardManifest:
+    """
+    Per-shard JSON-lines manifest.
+
+    One line per image, written as soon as the image is done so a crashed
+    node leaves a usable partial manifest, and a final summary line.
+    """
+
+    def __init__(self, path: str, index: int = 0, count: int = 1, key: str = 'path'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.index = index
+        self.count = count
+        self.key = key
+        self.started = time.time()
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._file = open(path, 'w')
+
+    def record(self, rel_path: str, status: str, **fields):
+        """
+        Append an image record.
+
+        Args:
+            rel_path (str): Image path relative to the input root.
+            status (str): 'restored', 'unrestored' (every logo failed),
+                'no_logos' or 'error'.
+            **fields: Extra JSON-serializable fields (output, logos,
+                restored, error, detections with box-local RLE masks).
+        """
+        entry = {'type': 'image', 'path': rel_path, 'status': status, 'shard': f"{self.index}/{self.count}"}
+        entry.update(fields)
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self):
+        summary = {
+            'type': 'summary', 'shard': f"{self.index}/{self.count}", 'shard_key': self.key,
+            'host': os.uname().nodename if hasattr(os, 'uname') else None,
+            'started': self.started, 'finished': time.time(), 'counts': self.counts,
+        }
+        with self._lock:
+            self._file.write(json.dumps(summary) + '\n')
+            self._file.close()
+
+
+def merge_manifests(paths: List[str]) -> dict:
+    """
+    Combine per-shard manifests into one run report.
+
+    Returns:
+        dict: Totals per status, per-shard summaries, missing or incomplete
+        shards, images seen more than once and the failed images.
+    """
+    counts = {}
+    shards = {}
+    seen = {}
+    failures = []
+    expected = None
+
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                index, count = parse_shard(entry['shard'])
+                if expected not in (None, count):
+                    raise ValueError(f"{path} is from a {count}-way run, others are {expected}-way")
+                expected = count
+
+                if entry['type'] == 'summary':
+                    shards[index] = entry
+                    continue
+                counts[entry['status']] = counts.get(entry['status'], 0) + 1
+                seen[entry['path']] = seen.get(entry['path'], 0) + 1
+                if entry['status'] == 'error':
+                    failures.append({'path': entry['path'], 'error': entry.get('error')})
+
+    expected = expected or 0
+    started = [s['started'] for s in shards.values()]
+    finished = [s['finished'] for s in shards.values()]
+    return {
+        'shard_count': expected,
+        'images': sum(counts.values()),
+        'counts': counts,
+        'missing_or_incomplete_shards': sorted(set(range(expected)) - set(shards)),
+        'duplicates': sorted(p for p, n in seen.items() if n > 1),
+        'wall_clock_s': (max(finished) - min(started)) if shards else None,
+        'shards': [shards[i] for i in sorted(shards)],
+        'failures': failures,
+    }
+
+
+if __name__ == "__main__":
+    print("Sharding module ready.")
@@ -0,0 +1,342 @@
+"""
+Sequence mode - restore logos in videos and frame sequences.
+
+Frames are streamed one at a time. Logos are detected and restored only on
+keyframes; in between, each restored patch is carried along with
+Lucas-Kanade optical flow and warped onto the following frames.
+
+Usage:
+    python video.py input/turntable.mp4 output/turntable_restored.mp4
+    python video.py input/frames/ output/frames/ --keyframe-interval 15
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from main import BRAND_ASSETS, create_detector, resolve_brand
+from generator import generate_patch, BLEND_METHOD
+from blender import blend_roi
+from masker import create_local_mask
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_INTERVAL = 30
+# Below this many tracked feature points a track is considered lost
+MIN_TRACK_POINTS = 8
+# Features are picked in the box grown by this fraction, since logos alone
+# are often too flat to track
+FEATURE_MARGIN = 0.2
+# A track too flat to follow is only kept while its region still matches the
+# keyframe: normalized cross-correlation when the region has texture, mean
+# absolute difference (brightness offset removed) when it is nearly uniform
+STATIC_MIN_NCC = 0.9
+STATIC_MAX_DIFF = 6.0
+STATIC_MIN_STD = 16.0
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class FrameSource:
+    """Streams BGR frames from a video file or a directory of images."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.is_dir = os.path.isdir(source)
+        self.fps = 30.0
+        if not self.is_dir:
+            cap = cv2.VideoCapture(source)
+            if not cap.isOpened():
+                raise FileNotFoundError(f"Could not open video {source}")
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+            cap.release()
+
+    def __iter__(self):
+        """Yield (frame_name, frame) pairs, one frame in memory at a time."""
+        if self.is_dir:
+            names = sorted(e.name for e in os.scandir(self.source)
+                           if e.is_file() and e.name.lower().endswith(FRAME_EXTENSIONS))
+            for name in names:
+                frame = cv2.imread(os.path.join(self.source, name))
+                if frame is None:
+                    logger.warning(f"Could not read frame {name}, skipping")
+                    continue
+                yield name, frame
+            return
+
+        cap = cv2.VideoCapture(self.source)
+        try:
+            index = 0
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield f"frame_{index:06d}.png", frame
+                index += 1
+        finally:
+            cap.release()
+
+
+class FrameSink:
+    """Writes frames to a video file or to a directory of images."""
+
+    def __init__(self, destination: str, fps: float, as_dir: bool):
+        self.destination = destination
+        self.fps = fps
+        self.as_dir = as_dir
+        self.writer = None
+        if as_dir:
+            os.makedirs(destination, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+
+    def write(self, name: str, frame: np.ndarray):
+        if self.as_dir:
+            cv2.imwrite(os.path.join(self.destination, name), frame)
+            return
+        if self.writer is None:
+            h, w = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.destination, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (w, h))
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class LogoTrack:
+    """A restored patch from a keyframe and where it has moved to since."""
+
+    def __init__(self, box: list, patch: np.ndarray, points: np.ndarray, mask: np.ndarray = None):
+        self.box = box
+        self.patch = patch
+        self.points = points
+        # Box-local blend mask; the whole patch if the detector gave no segmentation
+        self.mask = mask if mask is not None else np.full(patch.shape[:2], 255, np.uint8)
+        # 2x3 affine mapping keyframe coordinates to the current frame
+        self.transform = np.float32([[1, 0, 0], [0, 1, 0]])
+        # Too few features to track: the patch stays at its keyframe box for as
+        # long as the region still matches `template` (see static_track_holds)
+        self.static = len(points) == 0
+        self.template = None
+
+
+def _compose(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """Return the 2x3 affine equivalent to applying `inner`, then `outer`."""
+    o = np.vstack([outer, [0, 0, 1]])
+    i = np.vstack([inner, [0, 0, 1]])
+    return (o @ i)[:2].astype(np.float32)
+
+
+def _track_features(gray: np.ndarray, box: list):
+    """Pick good features to track around a box."""
+    mask = np.zeros_like(gray)
+    mask[_feature_region(box, gray.shape)] = 255
+    return cv2.goodFeaturesToTrack(gray, maxCorners=100, qualityLevel=0.01, minDistance=5, mask=mask)
+
+
+def _feature_region(box: list, shape: tuple) -> tuple:
+    """The box grown by FEATURE_MARGIN and clipped to the frame, as slices."""
+    x, y, w, h = box
+    mx, my = int(w * FEATURE_MARGIN), int(h * FEATURE_MARGIN)
+    return slice(max(0, y - my), min(shape[0], y + h + my)), slice(max(0, x - mx), min(shape[1], x + w + mx))
+
+
+def static_track_holds(track: LogoTrack, gray: np.ndarray) -> bool:
+    """
+    Check that a static track's region still looks like its keyframe.
+
+    Returns:
+        bool: False if the content moved or changed, i.e. the track was lost.
+    """
+    current = gray[_feature_region(track.box, gray.shape)].astype(np.float32)
+    template = track.template
+    if current.shape != template.shape or current.size == 0:
+        return False
+    if template.std() >= STATIC_MIN_STD and current.std() >= STATIC_MIN_STD:
+        ncc = cv2.matchTemplate(current, template, cv2.TM_CCOEFF_NORMED)[0, 0]
+        return ncc >= STATIC_MIN_NCC
+    diff = np.abs((current - current.mean()) - (template - template.mean())).mean()
+    return diff <= STATIC_MAX_DIFF
+
+
+def update_track(track: LogoTrack, prev_gray: np.ndarray, gray: np.ndarray) -> bool:
+    """
+    Advance a track by one frame with pyramidal Lucas-Kanade flow.
+
+    Returns:
+        bool: False if the track was lost.
+    """
+    points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, track.points, None, winSize=(21, 21), maxLevel=3)
+    if points is None:
+        return False
+    good = status.reshape(-1) == 1
+    if good.sum() < MIN_TRACK_POINTS:
+        return False
+
+    motion, inliers = cv2.estimateAffinePartial2D(track.points[good], points[good],
+                                                  method=cv2.RANSAC, ransacReprojThreshold=3.0)
+    if motion is None:
+        return False
+
+    track.transform = _compose(motion.astype(np.float32), track.transform)
+    track.points = points[good][inliers.reshape(-1) == 1].reshape(-1, 1, 2)
+    return len(track.points) >= MIN_TRACK_POINTS
+
+
+def render_track(frame: np.ndarray, track: LogoTrack) -> np.ndarray:
+    """
+    Warp a track's patch into the frame and blend it over its ROI.
+
+    Only a region around the warped box is touched; it is blended with the
+    same engine as generator.blend_patch.
+    """
+    x, y, w, h = track.box
+    frame_h, frame_w = frame.shape[:2]
+
+    corners = np.float32([[x, y], [x + w, y], [x + w, y + h], [x, y + h]]).reshape(-1, 1, 2)
+    rx, ry, rw, rh = cv2.boundingRect(cv2.transform(corners, track.transform))
+    x0, y0 = max(0, rx), max(0, ry)
+    x1, y1 = min(frame_w, rx + rw), min(frame_h, ry + rh)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return frame
+
+    # Patch pixel (u, v) -> keyframe (x + u, y + v) -> current frame -> ROI
+    warp = track.transform.copy()
+    warp[:, 2] += warp[:, :2] @ np.float32([x, y])
+    warp[:, 2] -= np.float32([x0, y0])
+    size = (x1 - x0, y1 - y0)
+    src = cv2.warpAffine(track.patch, warp, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    mask = cv2.warpAffine(track.mask, warp, size, flags=cv2.INTER_NEAREST)
+    mask = cv2.erode(mask, np.ones((3, 3), np.uint8))
+    if not mask.any():
+        return frame
+
+    return blend_roi(frame, src, mask, x0, y0, BLEND_METHOD, cv2.NORMAL_CLONE)
+
+
+def start_tracks(frame: np.ndarray, gray: np.ndarray, frame_path: str, detector, references: dict, brand_hint: str) -> list:
+    """
+    Detect and restore logos on a keyframe and start a track for each.
+    """
+    tracks = []
+    detections = detector.detect_and_crop(frame_path)
+    frame_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    for detection in detections:
+        box = [int(v) for v in detection['box']]
+        brand_key, label = resolve_brand(detection['label'], brand_hint)
+        reference_logo_path = BRAND_ASSETS.get(brand_key)
+        if not reference_logo_path or not os.path.exists(reference_logo_path):
+            logger.warning(f"    - No reference asset for '{label}'. Skipping.")
+            continue
+        if brand_key not in references:
+            references[brand_key] = Image.open(reference_logo_path)
+            references[brand_key].load()
+
+        try:
+            enhanced = generate_patch(frame_image, references[brand_key], brand_key, box)
+        except Exception as e:
+            logger.error(f"    - Keyframe logo at {box} failed, leaving it unrestored: {e}")
+            continue
+
+        x, y, w, h = box
+        patch = cv2.cvtColor(np.array(enhanced.convert('RGB').resize((w, h), Image.Resampling.LANCZOS)), cv2.COLOR_RGB2BGR)
+        points = _track_features(gray, box)
+        if points is None or len(points) < MIN_TRACK_POINTS:
+            logger.warning(f"    - Too few features to track logo at {box}; keeping it fixed while it matches the keyframe")
+            points = np.empty((0, 1, 2), np.float32)
+        mask = create_local_mask(box, detection['mask']) if detection.get('mask') is not None else None
+        track = LogoTrack(box, patch, points, mask)
+        if track.static:
+            track.template = gray[_feature_region(box, gray.shape)].astype(np.float32)
+        tracks.append(track)
+    return tracks
+
+
+def process_sequence(source: str, destination: str, detector=None, keyframe_interval: int = KEYFRAME_INTERVAL) -> dict:
+    """
+    Restore logos across a video or frame sequence.
+
+    A keyframe is taken every `keyframe_interval` frames, and early whenever
+    a track is lost. Logos too flat to track keep their patch at the keyframe
+    box while the region still matches the keyframe, and count as lost once
+    it doesn't. Only keyframes are sent to the detector and Gemini.
+
+    Args:
+        source (str): Video file or directory of frames.
+        destination (str): Output video file, or directory if source is a directory.
+        detector: Logo detector. Created with main.create_detector() if None.
+        keyframe_interval (int): Maximum frames between keyframes.
+
+    Returns:
+        dict: Counters for frames, keyframes and tracks started.
+    """
+    frames = FrameSource(source)
+    sink = FrameSink(destination, frames.fps, as_dir=frames.is_dir)
+    detector = detector or create_detector()
+    brand_hint = os.path.basename(os.path.normpath(source))
+    references = {}
+    stats = {'frames': 0, 'keyframes': 0, 'tracks': 0}
+
+    tracks = []
+    prev_gray = None
+    since_keyframe = keyframe_interval
+    start = time.time()
+
+    with tempfile.TemporaryDirectory(prefix='sequence_') as tmp_dir:
+        try:
+            for name, frame in frames:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+                if since_keyframe >= keyframe_interval:
+                    # The detector takes a path; reuse one temp file named after the source
+                    frame_path = os.path.join(tmp_dir, f"{os.path.splitext(brand_hint)[0]}.jpg")
+                    cv2.imwrite(frame_path, frame)
+                    logger.info(f"Keyframe {name}: detecting and restoring logos")
+                    tracks = start_tracks(frame, gray, frame_path, detector, references, brand_hint)
+                    stats['keyframes'] += 1
+                    stats['tracks'] += len(tracks)
+                    since_keyframe = 0
+                else:
+                    alive = []
+                    for track in tracks:
+                        if track.static:
+                            holds = static_track_holds(track, gray)
+                        else:
+                            holds = update_track(track, prev_gray, gray)
+                        if holds:
+                            alive.append(track)
+                    if len(alive) < len(tracks):
+                        logger.info(f"Frame {name}: {len(tracks) - len(alive)} track(s) lost, keyframe next")
+                        since_keyframe = keyframe_interval - 1
+                    tracks = alive
+
+                for track in tracks:
+                    frame = render_track(frame, track)
+
+                sink.write(name, frame)
+                prev_gray = gray
+                since_keyframe += 1
+                stats['frames'] += 1
+        finally:
+            sink.close()
+
+    elapsed = time.time() - start
+    logger.info(f"Processed {stats['frames']} frames ({stats['keyframes']} keyframes) in {elapsed:.1f}s")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restore logos in a video or frame sequence.")
+    parser.add_argument('source', help="Video file or directory of frames")
+    parser.add_argument('destination', help="Output video file, or output directory for frame sequences")
+    parser.add_argument('--keyframe-interval', type=int, default=KEYFRAME_INTERVAL,
+                        help="Maximum frames between detection/restoration keyframes")
+    args = parser.parse_args()
+
+    process_sequence(args.source, args.destination, keyframe_interval=args.keyframe_interval)
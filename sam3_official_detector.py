@@ -1,6 +1,11 @@
 """
 SAM 3 Logo Detector - Official Implementation
 Uses text prompts like "logo" to find and segment logos.
+
+Usage:
+    python sam3_official_detector.py                      # the bundled example image
+    python sam3_official_detector.py input/               # every image in a directory
+    python sam3_official_detector.py a.jpg b.png --prompt "BMW logo"
 """
 
 import torch
@@ -10,97 +15,240 @@ from sam3.model.sam3_image_processor import Sam3Processor
 import numpy as np
 import cv2
 import os
+import json
+import hashlib
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+OVERLAY_COLOR = (0, 255, 0)
+OVERLAY_ALPHA = 0.4
+# Overlay images and detection JSON are written by this many background threads
+WRITER_WORKERS = 2
+MAX_PENDING_WRITES = 8
+
+def _print_troubleshooting():
+    print("\nTroubleshooting:")
+    print("1. Request access to https://huggingface.co/facebook/sam3")
+    print("2. Run: huggingface-cli login")
+    print("3. Paste your HuggingFace token")
 
-def detect_logos_sam3(image_path, text_prompt="logo", output_dir="output"):
+def load_processor():
     """
-    Detect logos using SAM 3 with text prompts.
-    
-    Args:
-        image_path: Path to input image
-        text_prompt: Text description (e.g., "logo", "BMW logo")
-        output_dir: Directory to save results
-        
-    Returns:
-        List of detections with masks, boxes, scores
+    Build the SAM 3 model and its processor.
+
+    This is the slow part (checkpoint download on first run, weights to GPU);
+    build it once and pass it to detect_logos_sam3 for every image.
     """
-    
     print("Loading SAM 3 model...")
     print("Note: First run will download checkpoint from HuggingFace")
     print("Make sure you have requested access to: https://huggingface.co/facebook/sam3")
     print("And logged in with: huggingface-cli login")
-    
+
     try:
-        # Load the model
         model = build_sam3_image_model()
-        processor = Sam3Processor(model)
-        
-        # Load image
-        print(f"Processing: {image_path}")
-        image = Image.open(image_path)
-        inference_state = processor.set_image(image)
-        
-        # Prompt with text
-        print(f"Searching for: '{text_prompt}'")
-        output = processor.set_text_prompt(state=inference_state, prompt=text_prompt)
-        
-        # Get results
-        masks = output["masks"]
-        boxes = output["boxes"]
-        scores = output["scores"]
-        
-        print(f"\n✓ Found {len(masks)} logo(s)")
-        
-        # Prepare for visualization
-        detections = []
-        for i, (mask, box, score) in enumerate(zip(masks, boxes, scores)):
-            detections.append({
-                'mask': mask.cpu().numpy(),
-                'box': box.cpu().numpy().astype(int).tolist(),
-                'score': float(score)
-            })
-            print(f"  Logo {i+1}: Box={detections[i]['box']}, Score={score:.3f}")
-        
-        # Visualize
-        os.makedirs(output_dir, exist_ok=True)
-        image_np = np.array(image)
-        result_img = image_np.copy()
-        
-        for i, det in enumerate(detections):
-            # Get mask and ensure it's the right shape
-            mask = det['mask']
-            if mask.ndim == 3:
-                mask = mask[0]  # Remove batch dimension if present
-            mask = mask.astype(bool)
-            
-            box = det['box']
-            color = (0, 255, 0)
-            
-            # Apply mask overlay
-            if mask.shape == result_img.shape[:2]:
-                result_img[mask] = (result_img[mask] * 0.6 + np.array(color) * 0.4).astype(np.uint8)
-            
-            # Draw box
-            cv2.rectangle(result_img, (box[0], box[1]), (box[2], box[3]), color, 3)
-            cv2.putText(result_img, f"Logo {i+1}: {det['score']:.2f}", (box[0], box[1]-10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-        
-        output_path = os.path.join(output_dir, "sam3_official_detection.jpg")
-        cv2.imwrite(output_path, cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR))
-        
-        print(f"✓ Saved to: {output_path}")
-        
-        return detections
-        
+        return Sam3Processor(model)
     except Exception as e:
         print(f"\n❌ Error: {e}")
-        print("\nTroubleshooting:")
-        print("1. Request access to https://huggingface.co/facebook/sam3")
-        print("2. Run: huggingface-cli login")
-        print("3. Paste your HuggingFace token")
+        _print_troubleshooting()
         raise
 
+def render_overlay(image_np, detections, color=OVERLAY_COLOR, alpha=OVERLAY_ALPHA):
+    """
+    Draw all detections on a copy of an RGB image.
+
+    The masks are merged first and the tint is applied to their union in a
+    single pass, instead of one boolean-index blend per mask.
+    """
+    result_img = image_np.copy()
+    height, width = image_np.shape[:2]
+
+    masks = [det['mask'] for det in detections]
+    masks = [m.reshape(m.shape[-2:]) for m in masks if m.shape[-2:] == (height, width)]
+    if masks:
+        union = np.any(np.stack(masks), axis=0).astype(np.uint8)
+        tinted = cv2.addWeighted(image_np, 1 - alpha, np.full_like(image_np, color), alpha, 0)
+        cv2.copyTo(tinted, union, result_img)
+
+    for i, det in enumerate(detections):
+        box = det['box']
+        cv2.rectangle(result_img, (box[0], box[1]), (box[2], box[3]), color, 3)
+        cv2.putText(result_img, f"Logo {i+1}: {det['score']:.2f}", (box[0], box[1]-10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+    return result_img
+
+def save_results(image_np, detections, image_path, output_path, text_prompt, timings=None):
+    """
+    Write the overlay image and a JSON file with the detections next to it.
+
+    Returns:
+        str: Path to the overlay image.
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    result_img = render_overlay(image_np, detections)
+    cv2.imwrite(output_path, cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR))
+
+    summary = {
+        'image': image_path,
+        'prompt': text_prompt,
+        'detections': [
+            {'box': det['box'], 'score': det['score'], 'mask_area': int(np.count_nonzero(det['mask']))}
+            for det in detections
+        ],
+        'timings': timings or {},
+    }
+    with open(os.path.splitext(output_path)[0] + '.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return output_path
+
+def _output_path(image_path, output_dir):
+    """
+    Overlay path for an image. A short hash of the absolute input path keeps
+    same-named images from different directories (or with different
+    extensions) from overwriting each other in the flat output_dir.
+    """
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    digest = hashlib.sha1(os.path.abspath(image_path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, f"{stem}_{digest}_sam3_detection.jpg")
+
+def _run_model(processor, image, text_prompt):
+    """Run one image through SAM 3 and return its detections (masks as numpy)."""
+    with torch.inference_mode():
+        inference_state = processor.set_image(image)
+        output = processor.set_text_prompt(state=inference_state, prompt=text_prompt)
+
+    # One device->host copy per output instead of one per detection
+    masks = output["masks"].cpu().numpy()
+    boxes = output["boxes"].float().cpu().numpy().astype(int).tolist()
+    scores = output["scores"].float().cpu().numpy().tolist()
+    return [
+        {'mask': mask, 'box': box, 'score': float(score)}
+        for mask, box, score in zip(masks, boxes, scores)
+    ]
+
+def detect_logos_sam3(image_path, text_prompt="logo", output_dir="output", processor=None):
+    """
+    Detect logos using SAM 3 with text prompts.
+
+    Args:
+        image_path: Path to input image
+        text_prompt: Text description (e.g., "logo", "BMW logo")
+        output_dir: Directory to save results
+        processor: Sam3Processor from load_processor(); loaded here if None
+
+    Returns:
+        List of detections with masks, boxes, scores
+    """
+    processor = processor or load_processor()
+
+    # Load image
+    print(f"Processing: {image_path}")
+    image = Image.open(image_path).convert("RGB")
+
+    # Prompt with text
+    print(f"Searching for: '{text_prompt}'")
+    detections = _run_model(processor, image, text_prompt)
+
+    print(f"\n✓ Found {len(detections)} logo(s)")
+    for i, det in enumerate(detections):
+        print(f"  Logo {i+1}: Box={det['box']}, Score={det['score']:.3f}")
+
+    output_path = save_results(np.array(image), detections, image_path,
+                               _output_path(image_path, output_dir), text_prompt)
+    print(f"✓ Saved to: {output_path}")
+
+    return detections
+
+def iter_image_paths(inputs):
+    """Expand files and directories (top level, sorted) into image paths."""
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(e.name for e in os.scandir(path)
+                           if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))
+            for name in names:
+                yield os.path.join(path, name)
+        else:
+            yield path
+
+def detect_logos_batch(inputs, text_prompt="logo", output_dir="output"):
+    """
+    Detect logos in many images with one model load.
+
+    Images run through the model back to back on the calling thread, while
+    the overlay images and detection JSON are written in the background.
+
+    Args:
+        inputs: Image paths and/or directories of images
+        text_prompt: Text description (e.g., "logo", "BMW logo")
+        output_dir: Directory to save results
+
+    Returns:
+        List of per-image summaries (path, logo count, output, timings); the
+        masks are not kept, so memory stays flat over large batches.
+    """
+    start = time.perf_counter()
+    processor = load_processor()
+    print(f"✓ Model loaded in {time.perf_counter() - start:.1f}s")
+
+    results = []
+    pending = deque()
+
+    def finish_oldest_write():
+        record, future = pending.popleft()
+        try:
+            future.result()
+        except Exception as e:
+            print(f"❌ Could not write results for {record['image']}: {e}")
+            record['error'] = str(e)
+
+    with ThreadPoolExecutor(max_workers=WRITER_WORKERS, thread_name_prefix="sam3-writer") as writer:
+        for image_path in iter_image_paths(inputs):
+            try:
+                t0 = time.perf_counter()
+                image = Image.open(image_path).convert("RGB")
+                t1 = time.perf_counter()
+                detections = _run_model(processor, image, text_prompt)
+                t2 = time.perf_counter()
+            except Exception as e:
+                print(f"❌ {image_path}: {e}")
+                results.append({'image': image_path, 'error': str(e)})
+                continue
+
+            timings = {'load_s': round(t1 - t0, 4), 'inference_s': round(t2 - t1, 4)}
+            print(f"  {os.path.basename(image_path)}: {len(detections)} logo(s), "
+                  f"load {timings['load_s']*1000:.0f} ms, inference {timings['inference_s']*1000:.0f} ms")
+
+            output_path = _output_path(image_path, output_dir)
+            future = writer.submit(save_results, np.array(image), detections, image_path,
+                                   output_path, text_prompt, timings)
+            record = {'image': image_path, 'logos': len(detections), 'output': output_path, 'timings': timings}
+            results.append(record)
+            pending.append((record, future))
+            # Bound the images (and masks) waiting to be written
+            while len(pending) > MAX_PENDING_WRITES:
+                finish_oldest_write()
+
+        while pending:
+            finish_oldest_write()
+
+    done = [r for r in results if 'timings' in r]
+    elapsed = time.perf_counter() - start
+    if done:
+        mean_ms = 1000 * sum(r['timings']['inference_s'] for r in done) / len(done)
+        print(f"\n✓ {len(done)}/{len(results)} image(s) in {elapsed:.1f}s (mean inference {mean_ms:.0f} ms)")
+    print(f"✓ Results saved to: {output_dir}")
+    return results
+
 if __name__ == "__main__":
-    image_path = "input/BMW_24V_Drift_Kart_Licensed_Electric_Ride_on_Drift_Kart_[BDM0978]_-_AI_Background_Square_1.jpg"
-    
+    parser = argparse.ArgumentParser(description="Detect logos with SAM 3 text prompts.")
+    parser.add_argument('inputs', nargs='*',
+                        default=["input/BMW_24V_Drift_Kart_Licensed_Electric_Ride_on_Drift_Kart_[BDM0978]_-_AI_Background_Square_1.jpg"],
+                        help="Image files and/or directories of images")
+    parser.add_argument('--prompt', default="logo", help="Text prompt")
+    parser.add_argument('--output', default="output", help="Output directory")
+    args = parser.parse_args()
+
     # Detect logos with text prompt
-    detections = detect_logos_sam3(image_path, text_prompt="logo")
+    detect_logos_batch(args.inputs, text_prompt=args.prompt, output_dir=args.output)
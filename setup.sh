@@ -9,28 +9,43 @@ echo ""
 # Check Python
 python3 --version || { echo "ERROR: Python 3.12+ required"; exit 1; }
 
-echo "Step 1/5: Installing PyTorch with CUDA..."
+echo "Step 1/6: Installing PyTorch with CUDA..."
 pip install torch==2.7.0 torchvision torchaudio --index-url https://download.pytorch.org/whl/cu126
 
 echo ""
-echo "Step 2/5: Installing core dependencies..."
+echo "Step 2/6: Installing core dependencies..."
 pip install -r requirements.txt
 
 echo ""
-echo "Step 3/5: Installing SAM 3..."
+echo "Step 3/6: Installing SAM 3..."
 cd sam3
 pip install -e .
 cd ..
 
 echo ""
-echo "Step 4/5: Creating .env file..."
+echo "Step 4/6: Installing jpegtran (lossless JPEG output)..."
+# The pipeline patches restored regions into JPEGs with jpegtran -drop
+# (libjpeg-turbo 2.1+); without it every JPEG is fully re-encoded.
+if command -v apt-get > /dev/null; then
+    sudo apt-get install -y libjpeg-turbo-progs
+elif command -v brew > /dev/null; then
+    brew install jpeg-turbo
+fi
+if jpegtran -help 2>&1 | grep -q -- "-drop"; then
+    echo "✓ jpegtran with -drop support found"
+else
+    echo "WARNING: jpegtran with -drop support not found; install libjpeg-turbo 2.1+ or set JPEGTRAN in .env"
+fi
+
+echo ""
+echo "Step 5/6: Creating .env file..."
 if [ ! -f .env ]; then
     cp .env.example .env
     echo "Please edit .env and add your Gemini API key"
 fi
 
 echo ""
-echo "Step 5/5: HuggingFace authentication..."
+echo "Step 6/6: HuggingFace authentication..."
 echo ""
 echo "IMPORTANT: You need to:"
 echo "1. Request access to SAM 3: https://huggingface.co/facebook/sam3"
@@ -14,15 +14,15 @@ if %errorlevel% neq 0 (
     exit /b 1
 )
 
-echo Step 1/5: Installing PyTorch with CUDA...
+echo Step 1/6: Installing PyTorch with CUDA...
 pip install torch==2.7.0 torchvision torchaudio --index-url https://download.pytorch.org/whl/cu126
 
 echo.
-echo Step 2/5: Installing core dependencies...
+echo Step 2/6: Installing core dependencies...
 pip install -r requirements.txt
 
 echo.
-echo Step 3/5: Cloning and installing SAM 3...
+echo Step 3/6: Cloning and installing SAM 3...
 if not exist sam3 (
     echo Cloning SAM 3 from GitHub...
     git clone https://github.com/facebookresearch/sam3.git
@@ -32,7 +32,18 @@ pip install -e .
 cd ..
 
 echo.
-echo Step 4/5: Creating .env file...
+echo Step 4/6: Checking for jpegtran (lossless JPEG output)...
+jpegtran -help 2>&1 | findstr /C:"-drop" >nul
+if %errorlevel% neq 0 (
+    echo WARNING: jpegtran with -drop support not found. JPEG outputs will be fully re-encoded.
+    echo Install libjpeg-turbo 2.1+ from https://github.com/libjpeg-turbo/libjpeg-turbo/releases
+    echo and add its bin folder to PATH, or set JPEGTRAN in .env to the full path of jpegtran.exe
+) else (
+    echo jpegtran with -drop support found
+)
+
+echo.
+echo Step 5/6: Creating .env file...
 if not exist .env (
     copy .env.example .env
     echo Please edit .env and add your Gemini API key
@@ -40,7 +51,7 @@ if not exist .env (
 )
 
 echo.
-echo Step 5/5: HuggingFace authentication...
+echo Step 6/6: HuggingFace authentication...
 echo.
 echo IMPORTANT: You need to:
 echo 1. Request access to SAM 3: https://huggingface.co/facebook/sam3
@@ -31,7 +31,11 @@ fi
 echo ""
 echo "Step 1/5: Installing system dependencies..."
 sudo apt-get update
-sudo apt-get install -y git python3.12 python3.12-venv python3.12-dev python3-pip build-essential
+sudo apt-get install -y git python3.12 python3.12-venv python3.12-dev python3-pip build-essential libjpeg-turbo-progs
+# jpegtran -drop patches restored regions into JPEGs losslessly
+if ! jpegtran -help 2>&1 | grep -q -- "-drop"; then
+    echo "WARNING: jpegtran lacks -drop (needs libjpeg-turbo 2.1+, Ubuntu 22.04+); JPEG outputs will be fully re-encoded"
+fi
 
 echo ""
 echo "Step 2/5: Installing PyTorch with CUDA..."